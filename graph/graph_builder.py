@@ -1,190 +1,747 @@
-from typing import Dict, List, Any, Optional
-from neo4j import GraphDatabase
+from typing import Dict, List, Any, Optional, Tuple
+from neo4j import GraphDatabase, AsyncGraphDatabase
 from dataclasses import asdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
 import logging
+import os
+import queue
+from graph.graph_schema import GraphSchema
+
+# A Cypher query together with its parameters
+Statement = Tuple[str, Dict[str, Any]]
+
+# Constraint types are filtered client-side since their names differ between
+# Cypher versions (UNIQUENESS in Cypher 5, NODE_PROPERTY_UNIQUENESS in Cypher 25)
+SHOW_CONSTRAINTS_QUERY = """
+SHOW CONSTRAINTS YIELD labelsOrTypes, properties, type
+RETURN labelsOrTypes, properties, type
+"""
+
+def full_name(path: str, name: str) -> str:
+    """Return the fixed-length fullName key of the entity `name` in `path`.
+
+    The human-readable "<path>::<name>" form is stored as qualifiedName.
+    """
+    return hashlib.blake2b(f"{path}::{name}".encode(), digest_size=16).hexdigest()
+
+def missing_constraints(records) -> List[Tuple[str, str]]:
+    """Return the schema unique keys not covered by the given SHOW CONSTRAINTS records."""
+    existing = {
+        (label, prop)
+        for record in records
+        # Uniqueness and key constraints in any spelling; not existence or type
+        if 'UNIQUENESS' in record['type'] or record['type'].endswith('_KEY')
+        for label in record['labelsOrTypes']
+        for prop in record['properties']
+    }
+    return [key for key in GraphSchema.get_unique_keys() if key not in existing]
 
 class GraphBuilder:
-    def __init__(self, uri: str, user: str, password: str):
+    # Maximum number of UNWIND rows committed per transaction
+    BATCH_SIZE = 1000
+
+    def __init__(self,
+                 uri: str,
+                 user: str,
+                 password: str,
+                 max_connection_pool_size: int = 100,
+                 batch_size: Optional[int] = None,
+                 use_apoc: bool = False,
+                 session_pool_size: int = 8,
+                 max_workers: Optional[int] = None,
+                 database: Optional[str] = None):
         """Initialize the graph builder with Neo4j connection details."""
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        self.driver = GraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            max_connection_pool_size=max_connection_pool_size
+        )
+        self.max_connection_pool_size = max_connection_pool_size
+        # Naming the database saves the home-database lookup on every new session
+        self.database = database
+        # Threads used by ingest_many, bounded by the session and connection pools
+        self.max_workers = min(max_workers or session_pool_size, session_pool_size, max_connection_pool_size)
+        self.batch_size = batch_size or self.BATCH_SIZE
+        # Resolve CALLS relationships server-side with APOC for very large graphs
+        self.use_apoc = use_apoc
+        self._apoc_available: Optional[bool] = None
+
+        # Sessions are opened once and handed out by _session()
+        self._session_pool: queue.Queue = queue.Queue()
+        for _ in range(session_pool_size):
+            self._session_pool.put(self.driver.session(database=database))
         self.logger = logging.getLogger(__name__)
 
+        # Every MERGE relies on the unique constraints, so make sure they exist
+        # before any ingestion happens
+        try:
+            GraphSchema.initialize_schema(self)
+        except Exception as e:
+            self.logger.warning(f"Error initializing schema: {str(e)}")
+        try:
+            self._verify_constraints()
+        except Exception:
+            # The caller never gets the builder, so release what was opened
+            self.close()
+            raise
+
+    @classmethod
+    def from_env(cls, **kwargs) -> 'GraphBuilder':
+        """Create a builder from the NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD and NEO4J_DATABASE environment variables."""
+        kwargs.setdefault('database', os.environ.get("NEO4J_DATABASE"))
+        return cls(
+            os.environ["NEO4J_URI"],
+            os.environ.get("NEO4J_USER", "neo4j"),
+            os.environ["NEO4J_PASSWORD"],
+            **kwargs
+        )
+
+    def _verify_constraints(self):
+        """Check that every unique constraint required by the MERGEs is present."""
+        with self._session() as session:
+            missing = missing_constraints(session.run(SHOW_CONSTRAINTS_QUERY))
+
+        if missing:
+            missing_str = ", ".join(f"{label}.{prop}" for label, prop in missing)
+            self.logger.error(f"Missing unique constraints: {missing_str}")
+            raise RuntimeError(f"Missing unique constraints: {missing_str}")
+
+    @contextmanager
+    def _session(self):
+        """Borrow a session from the pool, blocking until one is free."""
+        session = self._session_pool.get()
+        try:
+            yield session
+        finally:
+            self._session_pool.put(session)
+
     def close(self):
-        """Close the Neo4j connection."""
+        """Close the pooled sessions and the Neo4j connection."""
+        while not self._session_pool.empty():
+            self._session_pool.get_nowait().close()
         self.driver.close()
 
-    def create_code_graph(self, ast_data: Dict[str, Any], file_path: str):
-        """Create a graph representation of the code structure."""
+    def create_code_graph(self,
+                          ast_data: Dict[str, Any],
+                          file_path: str,
+                          session=None,
+                          initial_load: bool = False):
+        """Create a graph representation of the code structure.
+
+        An open session can be passed in to reuse it across files.
+
+        With initial_load=True, nodes and relationships are written with CREATE
+        instead of MERGE in a single transaction. The caller must guarantee
+        that file_path has never been ingested; a collision fails on the
+        unique constraints and rolls the whole file back. use_apoc does not
+        apply to this mode: apoc.periodic.iterate commits its own batches,
+        which would break the single transaction, so calls are written with
+        UNWIND CREATE like everything else.
+        """
+        if session is None:
+            with self._session() as session:
+                return self.create_code_graph(ast_data, file_path, session, initial_load)
+
         try:
-            with self.driver.session() as session:
-                # Create file node
-                session.execute_write(self._create_file_node, file_path)
-                
-                # Create function nodes and relationships
-                if 'functions' in ast_data:
-                    for func in ast_data['functions']:
-                        session.execute_write(self._create_function_node, func, file_path)
-                
-                # Create class nodes and relationships
-                if 'classes' in ast_data:
-                    for cls in ast_data['classes']:
-                        session.execute_write(self._create_class_node, cls, file_path)
-                
-                # Create import relationships
-                if 'imports' in ast_data:
-                    for imp in ast_data['imports']:
-                        session.execute_write(self._create_import_node, imp, file_path)
-                
-                # Create call relationships
-                self._create_call_relationships(session, ast_data)
-                
+            if initial_load:
+                statements = (
+                    self._file_graph_statements(ast_data, file_path, initial_load=True)
+                    + self._call_statements(ast_data, file_path, initial_load=True)
+                )
+                session.execute_write(self._run_statements, statements)
+                return
+
+            # Create file, function, class and import nodes, one commit per batch
+            statements = self._file_graph_statements(ast_data, file_path)
+            for batch in self._transactions(statements, self.batch_size):
+                session.execute_write(self._run_statements, batch)
+
+            # Create call relationships
+            self._create_call_relationships(session, ast_data, file_path)
+
         except Exception as e:
             self.logger.error(f"Error creating graph: {str(e)}")
             raise
 
-    def _create_file_node(self, tx, file_path: str):
-        """Create a file node in the graph."""
-        query = """
-        MERGE (f:File {path: $path})
-        RETURN f
+    def batch_ingest(self, files: List[Tuple[Dict[str, Any], str]], initial_load: bool = False):
+        """Create the graphs of several (ast_data, file_path) pairs over a single session."""
+        with self._session() as session:
+            for ast_data, file_path in files:
+                self.create_code_graph(ast_data, file_path, session, initial_load)
+
+    def create_code_graph_batch(self, batch: List[Dict[str, Any]]):
+        """Create the graphs of many files with as few round-trips as possible.
+
+        `batch` is a list of {'file': path, 'ast': ast_data} dicts. All File
+        nodes go in one UNWIND, and the statements of every file are packed
+        into transactions of at most batch_size rows. Calls are written after
+        all files' functions, so calls to functions in other files of the
+        batch are resolved too.
         """
-        tx.run(query, path=file_path)
+        if not batch:
+            return
 
-    def _create_function_node(self, tx, func: Dict[str, Any], file_path: str):
-        """Create a function node and its relationships."""
         query = """
-        MATCH (f:File {path: $file_path})
-        MERGE (func:Function {
-            name: $name,
-            fullName: $full_name,
-            lineno: $lineno
-        })
-        SET func.docstring = $docstring,
-            func.args = $args,
-            func.returns = $returns
-        MERGE (f)-[:CONTAINS]->(func)
+        UNWIND $paths AS path
+        MERGE (f:File {path: path})
         """
-        tx.run(
-            query,
-            file_path=file_path,
-            name=func['name'],
-            full_name=f"{file_path}::{func['name']}",
-            lineno=func['lineno'],
-            docstring=func.get('docstring', ''),
-            args=func.get('args', []),
-            returns=func.get('returns')
-        )
+        paths = list(dict.fromkeys(item['file'] for item in batch))
+        statements = [(query, {'paths': paths})]
+        for item in batch:
+            ast_data, file_path = item['ast'], item['file']
+            statements += (
+                self._function_node_statements(ast_data.get('functions', []), file_path)
+                + self._class_node_statements(ast_data.get('classes', []), file_path)
+                + self._import_node_statements(ast_data.get('imports', []), file_path)
+            )
+        # Bases may be defined in any file of the batch, so inheritance is
+        # resolved once all classes exist
+        for item in batch:
+            statements += self._inheritance_statements(item['ast'], item['file'])
+        if not self.use_apoc:
+            for item in batch:
+                statements += self._call_statements(item['ast'], item['file'])
 
-    def _create_class_node(self, tx, cls: Dict[str, Any], file_path: str):
-        """Create a class node and its relationships."""
-        # Create class node
-        query = """
-        MATCH (f:File {path: $file_path})
-        MERGE (c:Class {
-            name: $name,
-            fullName: $full_name,
-            lineno: $lineno
-        })
-        SET c.docstring = $docstring
-        MERGE (f)-[:CONTAINS]->(c)
+        try:
+            with self._session() as session:
+                for tx_batch in self._transactions(statements, self.batch_size):
+                    session.execute_write(self._run_statements, tx_batch)
+
+                if self.use_apoc:
+                    for item in batch:
+                        self._create_call_relationships(session, item['ast'], item['file'])
+
+        except Exception as e:
+            self.logger.error(f"Error creating graph: {str(e)}")
+            raise
+
+    def ingest_many(self, files: List[Tuple[Dict[str, Any], str]], initial_load: bool = False):
+        """Create the graphs of several (ast_data, file_path) pairs concurrently.
+
+        The driver releases the GIL during Bolt I/O, so files are written from
+        a thread pool, each thread borrowing its own pooled session.
         """
-        tx.run(
-            query,
-            file_path=file_path,
-            name=cls['name'],
-            full_name=f"{file_path}::{cls['name']}",
-            lineno=cls['lineno'],
-            docstring=cls.get('docstring', '')
+        if not files:
+            return
+        with ThreadPoolExecutor(max_workers=min(len(files), self.max_workers)) as executor:
+            list(executor.map(
+                lambda file: self.create_code_graph(*file, initial_load=initial_load),
+                files
+            ))
+
+    @staticmethod
+    def _chunks(seq: List[Any], n: int):
+        """Yield successive slices of at most n items."""
+        for i in range(0, len(seq), n):
+            yield seq[i:i + n]
+
+    @staticmethod
+    def _transactions(statements: List[Statement], batch_size: int):
+        """Group statements into transactions of at most batch_size UNWIND rows.
+
+        Statements whose UNWIND list is larger than batch_size are split into
+        several statements. Statement order is preserved, so nodes are always
+        written before the statements that MATCH them.
+        """
+        batch = []
+        batch_rows = 0
+        for query, params in statements:
+            key = next((k for k, v in params.items() if isinstance(v, list)), None)
+            if key is None:
+                chunks = [params]
+            else:
+                chunks = [{**params, key: chunk} for chunk in GraphBuilder._chunks(params[key], batch_size)]
+
+            for chunk_params in chunks:
+                rows = len(chunk_params[key]) if key else 0
+                if batch and batch_rows + rows > batch_size:
+                    yield batch
+                    batch = []
+                    batch_rows = 0
+                batch.append((query, chunk_params))
+                batch_rows += rows
+
+        if batch:
+            yield batch
+
+    @classmethod
+    def _file_graph_statements(cls,
+                               ast_data: Dict[str, Any],
+                               file_path: str,
+                               initial_load: bool = False) -> List[Statement]:
+        """Build the statements that write all nodes of a file."""
+        return (
+            cls._file_node_statements(file_path, initial_load)
+            + cls._function_node_statements(ast_data.get('functions', []), file_path, initial_load)
+            + cls._class_node_statements(ast_data.get('classes', []), file_path, initial_load)
+            + cls._import_node_statements(ast_data.get('imports', []), file_path, initial_load)
+            + cls._inheritance_statements(ast_data, file_path, initial_load)
         )
 
-        # Create inheritance relationships
-        if cls.get('bases'):
-            query = """
-            MATCH (c:Class {fullName: $full_name})
-            MERGE (base:Class {name: $base_name})
-            MERGE (c)-[:INHERITS]->(base)
+    @staticmethod
+    def _unique_rows(rows: List[Dict[str, Any]], keys: Tuple[str, ...] = ('full_name',)) -> List[Dict[str, Any]]:
+        """Keep one row per value of keys; like repeated MERGE + SET, the last definition wins."""
+        return list({tuple(row[key] for key in keys): row for row in rows}.values())
+
+    @staticmethod
+    def _write_ops(initial_load: bool) -> Tuple[str, str]:
+        """Return the write clause and its ON CREATE prefix for MERGE or CREATE writes."""
+        if initial_load:
+            return 'CREATE', ''
+        return 'MERGE', 'ON CREATE '
+
+    @staticmethod
+    def _file_node_statements(file_path: str, initial_load: bool = False) -> List[Statement]:
+        """Create a file node in the graph."""
+        op, _ = GraphBuilder._write_ops(initial_load)
+        query = f"""
+        {op} (f:File {{path: $path}})
+        RETURN f
+        """
+        return [(query, {'path': file_path})]
+
+    @staticmethod
+    def _function_node_statements(functions: List[Dict[str, Any]],
+                                  file_path: str,
+                                  initial_load: bool = False) -> List[Statement]:
+        """Create function nodes and their relationships."""
+        rows = [
+            {
+                'name': func['name'],
+                'full_name': full_name(file_path, func['name']),
+                'qualified_name': f"{file_path}::{func['name']}",
+                'lineno': func['lineno'],
+                'docstring': func.get('docstring', ''),
+                'args': func.get('args', []),
+                'returns': func.get('returns')
+            }
+            for func in functions
+        ]
+        rows = GraphBuilder._unique_rows(rows)
+        if not rows:
+            return []
+
+        op, on_create = GraphBuilder._write_ops(initial_load)
+        query = f"""
+        UNWIND $rows AS r
+        MATCH (f:File {{path: $file_path}})
+        {op} (func:Function {{fullName: r.full_name}})
+        {on_create}SET func.name = r.name,
+            func.qualifiedName = r.qualified_name
+        SET func.lineno = r.lineno,
+            func.docstring = r.docstring,
+            func.args = r.args,
+            func.returns = r.returns
+        {op} (f)-[:CONTAINS]->(func)
+        """
+        return [(query, {'rows': rows, 'file_path': file_path})]
+
+    @staticmethod
+    def _class_node_statements(classes: List[Dict[str, Any]],
+                               file_path: str,
+                               initial_load: bool = False) -> List[Statement]:
+        """Create class nodes and their relationships."""
+        op, on_create = GraphBuilder._write_ops(initial_load)
+        statements = []
+        class_rows = []
+        method_rows = []
+        for cls in classes:
+            class_full_name = full_name(file_path, cls['name'])
+            class_rows.append({
+                'name': cls['name'],
+                'full_name': class_full_name,
+                'qualified_name': f"{file_path}::{cls['name']}",
+                'lineno': cls['lineno'],
+                'docstring': cls.get('docstring', '')
+            })
+            for method in cls.get('methods', []):
+                method_rows.append({
+                    'class_full_name': class_full_name,
+                    'name': method['name'],
+                    'full_name': full_name(file_path, f"{cls['name']}.{method['name']}"),
+                    'qualified_name': f"{file_path}::{cls['name']}.{method['name']}",
+                    'lineno': method['lineno'],
+                    'docstring': method.get('docstring', ''),
+                    'args': method.get('args', []),
+                    'returns': method.get('returns')
+                })
+
+        class_rows = GraphBuilder._unique_rows(class_rows)
+        method_rows = GraphBuilder._unique_rows(method_rows)
+
+        # Create class nodes
+        if class_rows:
+            query = f"""
+            UNWIND $rows AS r
+            MATCH (f:File {{path: $file_path}})
+            {op} (c:Class {{fullName: r.full_name}})
+            {on_create}SET c.name = r.name,
+                c.qualifiedName = r.qualified_name
+            SET c.lineno = r.lineno,
+                c.docstring = r.docstring
+            {op} (f)-[:CONTAINS]->(c)
             """
-            for base in cls['bases']:
-                tx.run(query, full_name=f"{file_path}::{cls['name']}", base_name=base)
+            statements.append((query, {'rows': class_rows, 'file_path': file_path}))
 
         # Create method nodes
-        for method in cls.get('methods', []):
-            method_query = """
-            MATCH (c:Class {fullName: $class_full_name})
-            MERGE (m:Method {
-                name: $name,
-                fullName: $full_name,
-                lineno: $lineno
-            })
-            SET m.docstring = $docstring,
-                m.args = $args,
-                m.returns = $returns
-            MERGE (c)-[:DEFINES]->(m)
+        if method_rows:
+            query = f"""
+            UNWIND $rows AS r
+            MATCH (c:Class {{fullName: r.class_full_name}})
+            {op} (m:Method {{fullName: r.full_name}})
+            {on_create}SET m.name = r.name,
+                m.qualifiedName = r.qualified_name
+            SET m.lineno = r.lineno,
+                m.docstring = r.docstring,
+                m.args = r.args,
+                m.returns = r.returns
+            {op} (c)-[:DEFINES]->(m)
+            """
+            statements.append((query, {'rows': method_rows}))
+
+        return statements
+
+    @staticmethod
+    def _inheritance_statements(ast_data: Dict[str, Any],
+                                file_path: str,
+                                initial_load: bool = False) -> List[Statement]:
+        """Create INHERITS relationships from the classes of a file to their bases.
+
+        Bases defined in the file link to the local class. Other bases link
+        to the class the file's imports point at, or else to the only Class
+        of that name; if neither is found they get an EXTERNAL placeholder.
+        """
+        classes = ast_data.get('classes', [])
+        imports = ast_data.get('imports', [])
+        op, _ = GraphBuilder._write_ops(initial_load)
+        local_classes = {cls['name'] for cls in classes}
+        local_rows = []
+        external_rows = []
+        for cls in classes:
+            class_full_name = full_name(file_path, cls['name'])
+            # Duplicate bases would only re-lock the same INHERITS pair
+            for base in dict.fromkeys(cls.get('bases', [])):
+                if base in local_classes:
+                    local_rows.append({
+                        'full_name': class_full_name,
+                        'base_full_name': full_name(file_path, base)
+                    })
+                    continue
+                name, suffixes = GraphBuilder._import_origin(base, imports)
+                external_rows.append({
+                    'full_name': class_full_name,
+                    'name': name,
+                    'suffixes': suffixes,
+                    # Placeholder keyed on fullName so MERGE still hits the
+                    # Class.fullName unique index
+                    'base_full_name': full_name("EXTERNAL", base),
+                    'base_name': base,
+                    'qualified_name': f"EXTERNAL::{base}"
+                })
+
+        # A class defined twice in a file would otherwise CREATE its edges twice
+        pair = ('full_name', 'base_full_name')
+        local_rows = GraphBuilder._unique_rows(local_rows, pair)
+        external_rows = GraphBuilder._unique_rows(external_rows, pair)
+
+        statements = []
+        if local_rows:
+            query = f"""
+            UNWIND $rows AS r
+            MATCH (c:Class {{fullName: r.full_name}})
+            MATCH (base:Class {{fullName: r.base_full_name}})
+            {op} (c)-[:INHERITS]->(base)
             """
-            tx.run(
-                method_query,
-                class_full_name=f"{file_path}::{cls['name']}",
-                name=method['name'],
-                full_name=f"{file_path}::{cls['name']}.{method['name']}",
-                lineno=method['lineno'],
-                docstring=method.get('docstring', ''),
-                args=method.get('args', []),
-                returns=method.get('returns')
+            statements.append((query, {'rows': local_rows}))
+
+        if external_rows:
+            # Placeholders may be shared with other files, so they are always
+            # MERGEd; Class.name is indexed, so the candidate lookup is cheap
+            query = f"""
+            UNWIND $rows AS r
+            MATCH (c:Class {{fullName: r.full_name}})
+            OPTIONAL MATCH (candidate:Class {{name: r.name}})
+            WHERE candidate <> c AND NOT candidate.qualifiedName STARTS WITH 'EXTERNAL::'
+            WITH c, r, collect(candidate) AS candidates
+            WITH c, r, CASE
+                WHEN size(r.suffixes) > 0
+                THEN [x IN candidates WHERE any(s IN r.suffixes WHERE x.qualifiedName ENDS WITH s)]
+                ELSE candidates
+            END AS matches
+            FOREACH (base IN CASE WHEN size(matches) = 1 THEN matches ELSE [] END |
+                {op} (c)-[:INHERITS]->(base)
             )
+            FOREACH (_ IN CASE WHEN size(matches) = 1 THEN [] ELSE [1] END |
+                MERGE (base:Class {{fullName: r.base_full_name}})
+                ON CREATE SET base.name = r.base_name,
+                    base.qualifiedName = r.qualified_name
+                {op} (c)-[:INHERITS]->(base)
+            )
+            """
+            statements.append((query, {'rows': external_rows}))
 
-    def _create_import_node(self, tx, imp: Dict[str, Any], file_path: str):
-        """Create an import node and its relationships."""
-        query = """
-        MATCH (f:File {path: $file_path})
-        MERGE (i:Import {
-            name: $name,
-            fullName: $full_name,
-            type: $type
-        })
-        SET i.asname = $asname,
-            i.module = $module,
-            i.lineno = $lineno
-        MERGE (f)-[:IMPORTS]->(i)
+        return statements
+
+    @staticmethod
+    def _import_origin(base: str, imports: List[Dict[str, Any]]) -> Tuple[str, List[str]]:
+        """Resolve a base class through a file's imports.
+
+        Returns the class name and the qualifiedName suffixes of the files the
+        imported module may live in, or no suffixes when no import binds the
+        base.
         """
-        tx.run(
-            query,
-            file_path=file_path,
-            name=imp['name'],
-            full_name=f"{file_path}::{imp['name']}",
-            type=imp['type'],
-            asname=imp.get('asname'),
-            module=imp.get('module'),
-            lineno=imp['lineno']
-        )
+        head, _, rest = base.partition('.')
+        for imp in imports:
+            if imp['type'] == 'import':
+                # "import a.b" binds a, "import a.b as ab" binds ab to a.b
+                bound = imp.get('asname') or imp['name'].split('.')[0]
+                target = imp['name'] if imp.get('asname') else bound
+            else:
+                bound = imp.get('asname') or imp['name']
+                target = f"{imp['module']}.{imp['name']}" if imp.get('module') else imp['name']
+            if bound != head:
+                continue
+            module, _, name = (f"{target}.{rest}" if rest else target).rpartition('.')
+            if not module:
+                break
+            module_path = module.replace('.', '/')
+            return name, [f"/{module_path}.py::{name}", f"/{module_path}/__init__.py::{name}"]
+        return base.rsplit('.', 1)[-1], []
+
+    @staticmethod
+    def _import_node_statements(imports: List[Dict[str, Any]],
+                                file_path: str,
+                                initial_load: bool = False) -> List[Statement]:
+        """Create import nodes and their relationships."""
+        rows = [
+            {
+                'name': imp['name'],
+                'full_name': full_name(file_path, imp['name']),
+                'qualified_name': f"{file_path}::{imp['name']}",
+                'type': imp['type'],
+                'asname': imp.get('asname'),
+                'module': imp.get('module'),
+                'lineno': imp['lineno']
+            }
+            for imp in imports
+        ]
+        rows = GraphBuilder._unique_rows(rows)
+        if not rows:
+            return []
+
+        op, on_create = GraphBuilder._write_ops(initial_load)
+        query = f"""
+        UNWIND $rows AS r
+        MATCH (f:File {{path: $file_path}})
+        {op} (i:Import {{fullName: r.full_name}})
+        {on_create}SET i.name = r.name,
+            i.qualifiedName = r.qualified_name
+        SET i.type = r.type,
+            i.asname = r.asname,
+            i.module = r.module,
+            i.lineno = r.lineno
+        {op} (f)-[:IMPORTS]->(i)
+        """
+        return [(query, {'rows': rows, 'file_path': file_path})]
 
-    def _create_call_relationships(self, session, ast_data: Dict[str, Any]):
+    def _create_call_relationships(self, session, ast_data: Dict[str, Any], file_path: str):
         """Create relationships for function calls."""
-        for func in ast_data.get('functions', []):
-            if func.get('calls'):
-                query = """
-                MATCH (caller:Function {name: $caller_name})
-                MATCH (callee:Function {name: $callee_name})
-                MERGE (caller)-[:CALLS]->(callee)
-                """
-                for call in func['calls']:
-                    session.execute_write(
-                        lambda tx: tx.run(query, caller_name=func['name'], callee_name=call)
-                    )
+        if self.use_apoc and self._has_apoc(session):
+            self._create_call_relationships_apoc(session, ast_data, file_path)
+            return
+
+        statements = self._call_statements(ast_data, file_path)
+        for batch in self._transactions(statements, self.batch_size):
+            session.execute_write(self._run_statements, batch)
+
+    def _has_apoc(self, session) -> bool:
+        """Check once whether apoc.periodic.iterate is installed on the server."""
+        if self._apoc_available is None:
+            query = """
+            SHOW PROCEDURES YIELD name
+            WHERE name = 'apoc.periodic.iterate'
+            RETURN count(*) AS n
+            """
+            self._apoc_available = session.run(query).single()['n'] > 0
+            if not self._apoc_available:
+                self.logger.warning("APOC is not available, falling back to UNWIND for CALLS relationships")
+        return self._apoc_available
+
+    def _create_call_relationships_apoc(self, session, ast_data: Dict[str, Any], file_path: str):
+        """Create relationships for function calls server-side with apoc.periodic.iterate.
+
+        The call pairs are first staged as temporary _PendingCall nodes, which
+        APOC then resolves into CALLS relationships in small batches. Requires
+        the APOC plugin on the Neo4j server.
+        """
+        staging_query = """
+        UNWIND $pairs AS p
+        CREATE (:_PendingCall {file: $file_path, callerLabel: $caller_label, caller: p.caller, callee: p.callee})
+        """
+        statements = [
+            (staging_query, {'pairs': pairs, 'file_path': file_path, 'caller_label': label})
+            for label, pairs in self._call_pairs(ast_data, file_path).items()
+            if pairs
+        ]
+        # Labels can't be parameterized, so each caller kind gets its own pass.
+        # Batches run serially as they MERGE onto shared callee nodes.
+        iterate_query = """
+        CALL apoc.periodic.iterate(
+            $outer,
+            $inner,
+            {batchSize: $batch_size, parallel: false, params: {file_path: $file_path}}
+        )
+        YIELD failedBatches, failedOperations, errorMessages
+        RETURN failedBatches, failedOperations, errorMessages
+        """
+        try:
+            for batch in self._transactions(statements, self.batch_size):
+                session.execute_write(self._run_statements, batch)
+
+            for label in ('Function', 'Method'):
+                record = session.run(
+                    iterate_query,
+                    outer="MATCH (p:_PendingCall {file: $file_path, callerLabel: '%s'}) RETURN p" % label,
+                    inner=(
+                        "MATCH (caller:%s {fullName: p.caller}) "
+                        "MATCH (callee:Function {name: p.callee}) "
+                        "MERGE (caller)-[:CALLS {caller_fullName: caller.fullName, callee_fullName: callee.fullName}]->(callee)"
+                        % label
+                    ),
+                    batch_size=self.batch_size,
+                    file_path=file_path
+                ).single()
+                # apoc.periodic.iterate reports failed inner batches instead of raising
+                if record and record['failedBatches']:
+                    message = (f"apoc.periodic.iterate failed {record['failedBatches']} batches "
+                               f"({record['failedOperations']} operations) for {label} calls "
+                               f"in {file_path}: {record['errorMessages']}")
+                    self.logger.error(message)
+                    raise RuntimeError(message)
+        finally:
+            # Pending calls whose caller or callee was not found are dropped too
+            session.run("MATCH (p:_PendingCall {file: $file_path}) DELETE p", file_path=file_path).consume()
+
+    @staticmethod
+    def _run_statements(tx, statements: List[Statement]):
+        """Run the given statements in one transaction."""
+        for query, params in statements:
+            tx.run(query, **params)
+
+    @staticmethod
+    def _call_pairs(ast_data: Dict[str, Any], file_path: str) -> Dict[str, List[Dict[str, str]]]:
+        """Collect the (caller, callee) rows of a file, keyed by the caller's label."""
+        # Calls are deduplicated per caller and the pairs sorted by caller so
+        # repeated calls don't re-lock the same CALLS relationship
+        function_pairs = sorted(
+            {
+                (full_name(file_path, func['name']), call)
+                for func in ast_data.get('functions', [])
+                for call in func.get('calls', [])
+            }
+        )
 
         # Handle method calls in classes
-        for cls in ast_data.get('classes', []):
-            for method in cls.get('methods', []):
-                if method.get('calls'):
-                    query = """
-                    MATCH (caller:Method {fullName: $caller_full_name})
-                    MATCH (callee:Function {name: $callee_name})
-                    MERGE (caller)-[:CALLS]->(callee)
-                    """
-                    for call in method['calls']:
-                        session.execute_write(
-                            lambda tx: tx.run(
-                                query,
-                                caller_full_name=f"{cls['name']}.{method['name']}",
-                                callee_name=call
-                            )
-                        )
\ No newline at end of file
+        method_pairs = sorted(
+            {
+                (full_name(file_path, f"{cls['name']}.{method['name']}"), call)
+                for cls in ast_data.get('classes', [])
+                for method in cls.get('methods', [])
+                for call in method.get('calls', [])
+            }
+        )
+
+        return {
+            'Function': [{'caller': caller, 'callee': callee} for caller, callee in function_pairs],
+            'Method': [{'caller': caller, 'callee': callee} for caller, callee in method_pairs]
+        }
+
+    @staticmethod
+    def _call_statements(ast_data: Dict[str, Any],
+                         file_path: str,
+                         initial_load: bool = False) -> List[Statement]:
+        """Build the statements that create CALLS relationships."""
+        op, _ = GraphBuilder._write_ops(initial_load)
+        statements = []
+        for label, pairs in GraphBuilder._call_pairs(ast_data, file_path).items():
+            if pairs:
+                query = f"""
+                UNWIND $pairs AS p
+                MATCH (caller:{label} {{fullName: p.caller}})
+                MATCH (callee:Function {{name: p.callee}})
+                {op} (caller)-[:CALLS {{caller_fullName: p.caller, callee_fullName: callee.fullName}}]->(callee)
+                """
+                statements.append((query, {'pairs': pairs}))
+
+        return statements
+
+
+class AsyncGraphBuilder:
+    """Asynchronous counterpart of GraphBuilder for ingesting many files concurrently."""
+
+    def __init__(self,
+                 uri: str,
+                 user: str,
+                 password: str,
+                 max_connection_pool_size: int = 64,
+                 batch_size: Optional[int] = None,
+                 database: Optional[str] = None):
+        """Initialize the async graph builder with Neo4j connection details."""
+        self.driver = AsyncGraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            max_connection_pool_size=max_connection_pool_size
+        )
+        self.batch_size = batch_size or GraphBuilder.BATCH_SIZE
+        self.database = database
+        self.logger = logging.getLogger(__name__)
+
+    async def initialize_schema(self):
+        """Create the schema and verify the unique constraints required by the MERGEs."""
+        async with self.driver.session(database=self.database) as session:
+            try:
+                for query in (GraphSchema.get_node_constraints()
+                              + GraphSchema.get_node_indexes()
+                              + GraphSchema.get_relationship_constraints()):
+                    await session.run(query)
+            except Exception as e:
+                self.logger.warning(f"Error initializing schema: {str(e)}")
+
+            result = await session.run(SHOW_CONSTRAINTS_QUERY)
+            missing = missing_constraints([record async for record in result])
+
+        if missing:
+            missing_str = ", ".join(f"{label}.{prop}" for label, prop in missing)
+            self.logger.error(f"Missing unique constraints: {missing_str}")
+            raise RuntimeError(f"Missing unique constraints: {missing_str}")
+
+    async def close(self):
+        """Close the Neo4j connection."""
+        await self.driver.close()
+
+    async def create_code_graph(self, ast_data: Dict[str, Any], file_path: str):
+        """Create a graph representation of the code structure."""
+        try:
+            statements = (
+                GraphBuilder._file_graph_statements(ast_data, file_path)
+                + GraphBuilder._call_statements(ast_data, file_path)
+            )
+            async with self.driver.session(database=self.database) as session:
+                for batch in GraphBuilder._transactions(statements, self.batch_size):
+                    await session.execute_write(self._run_statements, batch)
+        except Exception as e:
+            self.logger.error(f"Error creating graph: {str(e)}")
+            raise
+
+    async def ingest_many(self, files: List[Tuple[Dict[str, Any], str]]):
+        """Create the graphs of several (ast_data, file_path) pairs concurrently."""
+        await asyncio.gather(*[self.create_code_graph(ast_data, path) for ast_data, path in files])
+
+    @staticmethod
+    async def _run_statements(tx, statements: List[Statement]):
+        """Run the given statements in one transaction."""
+        for query, params in statements:
+            await tx.run(query, **params)
@@ -1,6 +1,6 @@
 from enum import Enum
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple, FrozenSet
 from datetime import datetime
 
 class NodeType(Enum):
@@ -24,7 +24,7 @@ class RelationType(Enum):
     DEPENDS_ON = "DEPENDS_ON"
     USES = "USES"
 
-@dataclass
+@dataclass(slots=True)
 class NodeProperties:
     """Base properties for all nodes."""
     name: str
@@ -32,7 +32,7 @@ class NodeProperties:
     created_at: datetime = field(default_factory=datetime.now, init=False)
     updated_at: datetime = field(default_factory=datetime.now, init=False)
 
-@dataclass
+@dataclass(slots=True)
 class FileProperties(NodeProperties):
     """Properties specific to File nodes."""
     path: str
@@ -40,7 +40,7 @@ class FileProperties(NodeProperties):
     hash: Optional[str] = None
     language: Optional[str] = None
 
-@dataclass
+@dataclass(slots=True)
 class FunctionProperties(NodeProperties):
     """Properties specific to Function nodes."""
     args: List[str]
@@ -50,7 +50,7 @@ class FunctionProperties(NodeProperties):
     complexity: Optional[int] = None
     is_async: bool = False
 
-@dataclass
+@dataclass(slots=True)
 class ClassProperties(NodeProperties):
     """Properties specific to Class nodes."""
     bases: List[str]
@@ -59,7 +59,7 @@ class ClassProperties(NodeProperties):
     methods: List[str]
     is_abstract: bool = False
 
-@dataclass
+@dataclass(slots=True)
 class ImportProperties(NodeProperties):
     """Properties specific to Import nodes."""
     module: Optional[str]
@@ -67,25 +67,69 @@ class ImportProperties(NodeProperties):
     type: str  # 'import' or 'importfrom'
     lineno: int
 
-@dataclass
+@dataclass(slots=True)
 class RelationshipProperties:
     """Properties for relationships between nodes."""
     type: RelationType
     created_at: datetime = field(default_factory=datetime.now)
     metadata: Optional[Dict[str, Any]] = None
 
+# Properties each node type must carry, used by GraphSchema.validate_node
+_REQUIRED_PROPS: Dict[NodeType, FrozenSet[str]] = {
+    NodeType.FILE: frozenset({'path', 'name', 'fullName'}),
+    NodeType.FUNCTION: frozenset({'name', 'fullName', 'args', 'lineno'}),
+    NodeType.CLASS: frozenset({'name', 'fullName', 'bases', 'lineno'}),
+    NodeType.IMPORT: frozenset({'name', 'fullName', 'type', 'lineno'}),
+    NodeType.METHOD: frozenset({'name', 'fullName', 'args', 'lineno'})
+}
+
+# Allowed end node types per relationship and start node type, used by
+# GraphSchema.validate_relationship
+_VALID_RELS: Dict[RelationType, Dict[NodeType, FrozenSet[NodeType]]] = {
+    RelationType.CONTAINS: {
+        NodeType.FILE: frozenset({NodeType.FUNCTION, NodeType.CLASS, NodeType.IMPORT}),
+        NodeType.CLASS: frozenset({NodeType.METHOD})
+    },
+    RelationType.CALLS: {
+        NodeType.FUNCTION: frozenset({NodeType.FUNCTION}),
+        NodeType.METHOD: frozenset({NodeType.FUNCTION, NodeType.METHOD})
+    },
+    RelationType.INHERITS: {
+        NodeType.CLASS: frozenset({NodeType.CLASS})
+    },
+    RelationType.IMPORTS: {
+        NodeType.FILE: frozenset({NodeType.IMPORT})
+    }
+}
+
 class GraphSchema:
     """Defines the schema for the code knowledge graph."""
 
+    @staticmethod
+    def get_unique_keys() -> List[Tuple[str, str]]:
+        """Get the (label, property) pairs that MERGE statements key on."""
+        return [
+            (NodeType.FILE.value, 'path'),
+            (NodeType.FUNCTION.value, 'fullName'),
+            (NodeType.CLASS.value, 'fullName'),
+            (NodeType.IMPORT.value, 'fullName'),
+            (NodeType.METHOD.value, 'fullName')
+        ]
+
     @staticmethod
     def get_node_constraints() -> List[str]:
         """Get Cypher queries for creating node constraints."""
         return [
-            "CREATE CONSTRAINT IF NOT EXISTS FOR (f:File) REQUIRE f.path IS UNIQUE",
-            "CREATE CONSTRAINT IF NOT EXISTS FOR (f:Function) REQUIRE f.fullName IS UNIQUE",
-            "CREATE CONSTRAINT IF NOT EXISTS FOR (c:Class) REQUIRE c.fullName IS UNIQUE",
-            "CREATE CONSTRAINT IF NOT EXISTS FOR (i:Import) REQUIRE i.fullName IS UNIQUE",
-            "CREATE CONSTRAINT IF NOT EXISTS FOR (m:Method) REQUIRE m.fullName IS UNIQUE"
+            f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE"
+            for label, prop in GraphSchema.get_unique_keys()
+        ]
+
+    @staticmethod
+    def get_relationship_constraints() -> List[str]:
+        """Get Cypher queries for creating relationship constraints (Neo4j 5.7+)."""
+        return [
+            "CREATE CONSTRAINT IF NOT EXISTS FOR ()-[r:CALLS]-() "
+            "REQUIRE (r.caller_fullName, r.callee_fullName) IS UNIQUE"
         ]
 
     @staticmethod
@@ -102,43 +146,22 @@ class GraphSchema:
     @staticmethod
     def initialize_schema(graph_builder) -> None:
         """Initialize the schema in Neo4j."""
-        with graph_builder.driver.session() as session:
+        with graph_builder.driver.session(database=graph_builder.database) as session:
             for constraint in GraphSchema.get_node_constraints():
                 session.run(constraint)
             for index in GraphSchema.get_node_indexes():
                 session.run(index)
+            # Run last: servers older than 5.7 reject relationship constraints,
+            # in which case CALLS pairs are still deduplicated client-side
+            for constraint in GraphSchema.get_relationship_constraints():
+                session.run(constraint)
 
     @staticmethod
     def validate_node(node_type: NodeType, properties: Dict[str, Any]) -> bool:
         """Validate node properties against schema."""
-        required_props = {
-            NodeType.FILE: {'path', 'name', 'fullName'},
-            NodeType.FUNCTION: {'name', 'fullName', 'args', 'lineno'},
-            NodeType.CLASS: {'name', 'fullName', 'bases', 'lineno'},
-            NodeType.IMPORT: {'name', 'fullName', 'type', 'lineno'},
-            NodeType.METHOD: {'name', 'fullName', 'args', 'lineno'}
-        }
-
-        return all(prop in properties for prop in required_props.get(node_type, set()))
+        return _REQUIRED_PROPS.get(node_type, frozenset()).issubset(properties)
 
     @staticmethod
     def validate_relationship(rel_type: RelationType, start_type: NodeType, end_type: NodeType) -> bool:
         """Validate relationship between node types."""
-        valid_relationships = {
-            RelationType.CONTAINS: {
-                NodeType.FILE: {NodeType.FUNCTION, NodeType.CLASS, NodeType.IMPORT},
-                NodeType.CLASS: {NodeType.METHOD}
-            },
-            RelationType.CALLS: {
-                NodeType.FUNCTION: {NodeType.FUNCTION},
-                NodeType.METHOD: {NodeType.FUNCTION, NodeType.METHOD}
-            },
-            RelationType.INHERITS: {
-                NodeType.CLASS: {NodeType.CLASS}
-            },
-            RelationType.IMPORTS: {
-                NodeType.FILE: {NodeType.IMPORT}
-            }
-        }
-
-        return end_type in valid_relationships.get(rel_type, {}).get(start_type, set())
+        return end_type in _VALID_RELS.get(rel_type, {}).get(start_type, frozenset())
@@ -1,11 +1,30 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator
 from dataclasses import dataclass
+from functools import lru_cache
+from collections import OrderedDict
+import heapq
 import ast
+import io
 from parsers.ast_extractor import FunctionInfo, ClassInfo
 from graph.graph_builder import GraphBuilder
 import json
 
-@dataclass
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+@lru_cache(maxsize=4096)
+def _format_code_cached(code: str) -> str:
+    """Normalize code formatting, memoized on the source string"""
+    try:
+        # Parse and unparse to normalize formatting
+        return ast.unparse(ast.parse(code))
+    except Exception:
+        # Return original if parsing fails
+        return code
+
+@dataclass(slots=True)
 class ContextNode:
     """Represents a code context node for LLM prompting"""
     type: str  # 'function', 'class', 'method'
@@ -14,22 +33,67 @@ class ContextNode:
     docstring: Optional[str]
     dependencies: List[str]
     importance_score: float
+    tokens: int = 0  # Token count of code + docstring, computed once
 
 class PromptBuilder:
+    # Maximum number of functions whose dependencies are remembered
+    DEPENDENCY_CACHE_SIZE = 10000
+
     def __init__(self, graph_builder: GraphBuilder):
         self.graph_builder = graph_builder
         self.max_context_length = 4096  # Token limit for context
+        self._session = None  # Opened lazily on the first graph lookup
+        # Dependencies per function name, in LRU order; cleared on re-ingest
+        self._dependency_cache: 'OrderedDict[str, List[Dict[str, Any]]]' = OrderedDict()
+        self._enc = self._load_encoding()
+
+    def close(self):
+        """Close the graph session held by this builder and drop its cache."""
+        self._dependency_cache.clear()
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def __del__(self):
+        """Cleanup when the instance is destroyed"""
+        if hasattr(self, '_session'):
+            self.close()
+
+    def invalidate_dependencies(self):
+        """Forget cached dependencies, e.g. after the graph was re-ingested."""
+        self._dependency_cache.clear()
+
+    @staticmethod
+    def _load_encoding():
+        """Load the tiktoken encoder, or None to fall back to the length heuristic"""
+        if tiktoken is None:
+            return None
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            return None
+
+    def _count_tokens(self, code: str, docstring: Optional[str]) -> int:
+        """Count the tokens of a node's code and docstring"""
+        if self._enc is None:
+            # Roughly 4 characters per token
+            return (len(code) + len(docstring or "")) >> 2
+        return len(self._enc.encode(code)) + (len(self._enc.encode(docstring)) if docstring else 0)
+
+    def _get_session(self):
+        """Return the session reused for all graph lookups"""
+        if self._session is None:
+            self._session = self.graph_builder.driver.session(database=self.graph_builder.database)
+        return self._session
 
     def build_prompt(self, 
                     target_functions: List[Dict[str, Any]], 
                     query: str,
                     include_dependencies: bool = True) -> str:
         """Build a structured prompt for the LLM"""
+        # Nodes come back ordered by importance
         context_nodes = self._gather_context(target_functions, include_dependencies)
         
-        # Sort nodes by importance
-        context_nodes.sort(key=lambda x: x.importance_score, reverse=True)
-        
         # Build the prompt
         prompt = self._create_prompt_template(
             context_nodes=context_nodes,
@@ -42,112 +106,136 @@ class PromptBuilder:
                     target_functions: List[Dict[str, Any]], 
                     include_dependencies: bool) -> List[ContextNode]:
         """Gather relevant context nodes for the prompt"""
-        context_nodes = []
-        
+        return self._prune_context(self._iter_context(target_functions, include_dependencies))
+
+    def _iter_context(self,
+                    target_functions: List[Dict[str, Any]],
+                    include_dependencies: bool) -> Iterator[ContextNode]:
+        """Yield context nodes for the targets and their dependencies"""
+        if include_dependencies:
+            # Get dependencies of all targets from the graph in one query
+            dependencies = self._get_function_dependencies_bulk(
+                [func['name'] for func in target_functions]
+            )
+
         for func in target_functions:
             # Add the target function
-            context_nodes.append(self._create_context_node(func))
+            yield self._create_context_node(func)
             
             if include_dependencies:
-                # Get dependencies from the graph
-                deps = self._get_function_dependencies(func['name'])
-                for dep in deps:
-                    context_nodes.append(self._create_context_node(dep))
-        
-        return self._prune_context(context_nodes)
+                for dep in dependencies[func['name']]:
+                    yield self._create_context_node(dep)
 
     def _create_context_node(self, code_info: Dict[str, Any]) -> ContextNode:
         """Create a context node from code info"""
         # Calculate importance score based on various factors
         importance = self._calculate_importance(code_info)
+        docstring = code_info.get('docstring')
         
         return ContextNode(
             type=code_info.get('type', 'function'),
             name=code_info['name'],
             code=code_info['code'],
-            docstring=code_info.get('docstring'),
+            docstring=docstring,
             dependencies=code_info.get('dependencies', []),
-            importance_score=importance
+            importance_score=importance,
+            tokens=self._count_tokens(code_info['code'], docstring)
         )
 
     def _calculate_importance(self, code_info: Dict[str, Any]) -> float:
         """Calculate importance score for context prioritization"""
-        score = 1.0
+        calls = code_info.get('calls') or ()
+        dependencies = code_info.get('dependencies') or ()
         
         # Factors that increase importance
-        if code_info.get('docstring'):
-            score += 0.3
-        if code_info.get('calls', []):
-            score += 0.2 * len(code_info['calls'])
-        if code_info.get('dependencies', []):
-            score += 0.1 * len(code_info['dependencies'])
-            
-        return score
-
-    def _get_function_dependencies(self, function_name: str) -> List[Dict[str, Any]]:
-        """Get function dependencies from the graph"""
-        query = """
-        MATCH (f:Function {name: $name})-[:CALLS|USES]->(dep)
-        RETURN dep
-        """
-        
-        with self.graph_builder.driver.session() as session:
-            result = session.run(query, name=function_name)
-            return [dict(record['dep']) for record in result]
+        return (1.0
+                + (0.3 if code_info.get('docstring') else 0.0)
+                + 0.2 * len(calls)
+                + 0.1 * len(dependencies))
+
+    def _get_function_dependencies_bulk(self, names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Get dependencies of several functions from the graph in a single query"""
+        # Collected locally so entries evicted mid-call are still returned
+        found = {}
+        for name in dict.fromkeys(names):
+            if name in self._dependency_cache:
+                self._dependency_cache.move_to_end(name)
+                found[name] = self._dependency_cache[name]
+        missing = [name for name in dict.fromkeys(names) if name not in found]
+        if missing:
+            query = """
+            MATCH (f:Function)
+            WHERE f.name IN $names
+            OPTIONAL MATCH (f)-[:CALLS|USES]->(dep)
+            RETURN f.name AS src, collect(dep) AS deps
+            """
+            for name in missing:
+                found[name] = []
+            result = self._get_session().run(query, names=missing)
+            for record in result:
+                found[record['src']].extend(dict(dep) for dep in record['deps'])
+            for name in missing:
+                self._dependency_cache[name] = found[name]
+                if len(self._dependency_cache) > self.DEPENDENCY_CACHE_SIZE:
+                    self._dependency_cache.popitem(last=False)
+
+        return {name: found[name] for name in names}
 
-    def _prune_context(self, nodes: List[ContextNode]) -> List[ContextNode]:
-        """Prune context to fit within token limit"""
-        pruned_nodes = []
+    def _prune_context(self, nodes: Iterable[ContextNode]) -> List[ContextNode]:
+        """Keep the most important nodes that fit within the token limit"""
+        # Min-heap on importance; on ties the later node is evicted first
+        heap = []
         current_length = 0
         
-        for node in nodes:
-            # Estimate tokens (rough approximation)
-            node_tokens = len(node.code.split()) + len(node.docstring.split() if node.docstring else [])
-            
-            if current_length + node_tokens <= self.max_context_length:
-                pruned_nodes.append(node)
-                current_length += node_tokens
-            else:
-                break
+        for seq, node in enumerate(nodes):
+            # A node larger than the whole budget can never be kept
+            if node.tokens > self.max_context_length:
+                continue
+
+            # Make room by evicting only nodes that rank below the new one
+            rank = (node.importance_score, -seq)
+            evicted = []
+            while (current_length + node.tokens > self.max_context_length
+                   and heap and heap[0][:2] < rank):
+                evicted.append(heapq.heappop(heap))
+                current_length -= evicted[-1][2].tokens
+
+            if current_length + node.tokens > self.max_context_length:
+                # It still does not fit, so keep what was there instead
+                for entry in evicted:
+                    heapq.heappush(heap, entry)
+                    current_length += entry[2].tokens
+                continue
+
+            heapq.heappush(heap, (node.importance_score, -seq, node))
+            current_length += node.tokens
                 
-        return pruned_nodes
+        return [node for _, _, node in sorted(heap, reverse=True)]
 
     def _create_prompt_template(self, 
                                 context_nodes: List[ContextNode], 
                                 query: str) -> str:
         """Create the final prompt template"""
-        prompt_parts = [
-            "You are an expert code assistant. Analyze the following code and answer the query.",
-            "\nContext:",
-        ]
+        buf = io.StringIO()
+        write = buf.write
+        write("You are an expert code assistant. Analyze the following code and answer the query.\n")
+        write("\nContext:")
         
         # Add context nodes
         for node in context_nodes:
-            prompt_parts.extend([
-                f"\n{node.type.upper()}: {node.name}",
-                f"Documentation: {node.docstring if node.docstring else 'None'}",
-                "Code:",
-                "```python",
-                node.code,
-                "```\n"
-            ])
+            write(f"\n\n{node.type.upper()}: {node.name}\n")
+            write(f"Documentation: {node.docstring if node.docstring else 'None'}\n")
+            write("Code:\n```python\n")
+            write(node.code)
+            write("\n```\n")
         
         # Add query
-        prompt_parts.extend([
-            "\nQuery:",
-            query,
-            "\nPlease provide a detailed response based on the code context above."
-        ])
+        write("\n\nQuery:\n")
+        write(query)
+        write("\n\nPlease provide a detailed response based on the code context above.")
         
-        return "\n".join(prompt_parts)
+        return buf.getvalue()
 
     def format_code_for_prompt(self, code: str) -> str:
         """Format code for inclusion in the prompt"""
-        try:
-            # Parse and unparse to normalize formatting
-            tree = ast.parse(code)
-            formatted_code = ast.unparse(tree)
-            return formatted_code
-        except Exception:
-            # Return original if parsing fails
-            return code
\ No newline at end of file
+        return _format_code_cached(code)
\ No newline at end of file
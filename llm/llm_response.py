@@ -217,8 +217,9 @@
 #         # Sort by score and return responses
 #         return [r for _, r in sorted(scored_responses, reverse=True)]
 
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, AsyncIterator
+from dataclasses import dataclass, field
+import asyncio
 import json
 import re
 import markdown
@@ -227,6 +228,59 @@ from pygments.lexers import PythonLexer
 from pygments.formatters import HtmlFormatter
 import httpx
 
+_CODE_BLOCK_RE = re.compile(r"```(?:python)?\n(.*?)\n```", re.DOTALL)
+_CODE_BLOCK_STRIP_RE = re.compile(r"```.*?```", re.DOTALL)
+_WORD_RE = re.compile(r"\w+")
+_TOKEN_RE = re.compile(r"\S+")
+
+# Pygments objects are stateless once built, so all processors share them
+_PY_LEXER = PythonLexer()
+_HTML_FMT = HtmlFormatter(
+    style='monokai',
+    linenos=True,
+    cssclass='source'
+)
+_PYGMENTS_CSS = _HTML_FMT.get_style_defs('.highlight')
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+def _has_at_least_words(text: str, n: int) -> bool:
+    """Check whether text has at least n whitespace-separated words, stopping early"""
+    count = 0
+    for _ in _TOKEN_RE.finditer(text):
+        count += 1
+        if count >= n:
+            return True
+    return False
+
+def _count_mentions(lower_text: str, names: List[str]) -> Dict[str, int]:
+    """Count non-overlapping occurrences of each lower-cased name in lower_text
+
+    Matches str.count, except that an empty name never counts.
+    """
+    if ahocorasick is None:
+        return {name: lower_text.count(name) if name else 0 for name in names}
+
+    # Single pass over the text for all names at once
+    automaton = ahocorasick.Automaton()
+    for name in names:
+        if name:
+            automaton.add_word(name, name)
+    counts = dict.fromkeys(names, 0)
+    if len(automaton):
+        automaton.make_automaton()
+        # End index of the last counted match per name; matches arrive in
+        # order of their end, so skipping overlaps gives str.count's result
+        last_end: Dict[str, int] = {}
+        for end, name in automaton.iter(lower_text):
+            if end - len(name) >= last_end.get(name, -1):
+                counts[name] += 1
+                last_end[name] = end
+    return counts
+
 @dataclass
 class CodeReference:
     """Reference to a specific piece of code in the graph"""
@@ -243,38 +297,66 @@ class ProcessedResponse:
     references: List[CodeReference]
     confidence_score: float
     markdown_content: str
+    # Lower-cased markdown_content, cached for ranking
+    _content_lower: str = field(default='', repr=False)
 
 class ResponseProcessor:
-    def __init__(self, ollama_base_url: str = "http://localhost:11434"):
+    def __init__(self, ollama_base_url: str = "http://localhost:11434", max_concurrency: int = 5):
         # Initialize Ollama client
         self.ollama_base_url = ollama_base_url
         self.model_name = "phi-4-mini" 
+        # One client for all requests so the connection to Ollama is reused
+        self._client = httpx.AsyncClient(base_url=ollama_base_url, timeout=60.0)
+        # Limits concurrent generations in process_batch
+        self._sem = asyncio.Semaphore(max_concurrency)
 
         # Initialize Pygments components
-        self.python_lexer = PythonLexer()
-        self.html_formatter = HtmlFormatter(
-            style='monokai',
-            linenos=True,
-            cssclass='source'
-        )
+        self.python_lexer = _PY_LEXER
+        self.html_formatter = _HTML_FMT
+        self._pygments_css = _PYGMENTS_CSS
 
-    async def generate_response(self, prompt: str) -> str:
-        """Generate response using Ollama"""
-        url = f"{self.ollama_base_url}/api/generate"
+    async def aclose(self):
+        """Close the HTTP client"""
+        await self._client.aclose()
+
+    async def generate_response_stream(self, prompt: str) -> AsyncIterator[str]:
+        """Generate response using Ollama, yielding tokens as they arrive"""
         data = {
             "prompt": prompt,
             "model": self.model_name,
-            "stream": False,
+            "stream": True,
             "options": {
                 "temperature": 0.7,
                 "top_p": 0.9,
                 "num_predict": 1024
             }
         }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data)
+        async with self._client.stream("POST", "/api/generate", json=data) as response:
             response.raise_for_status()
-            return response.json()['response']
+            # Ollama streams one JSON object per line
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                # Failures mid-stream arrive as an error line, not a status code
+                if chunk.get('error'):
+                    raise RuntimeError(f"Ollama generation failed: {chunk['error']}")
+                yield chunk.get('response', '')
+                if chunk.get('done'):
+                    break
+
+    async def generate_response(self, prompt: str) -> str:
+        """Generate response using Ollama"""
+        return "".join([token async for token in self.generate_response_stream(prompt)])
+
+    async def _generate_limited(self, prompt: str) -> str:
+        """Generate a response once a concurrency slot is free"""
+        async with self._sem:
+            return await self.generate_response(prompt)
+
+    async def process_batch(self, prompts: List[str]) -> List[str]:
+        """Generate responses for several prompts concurrently"""
+        return await asyncio.gather(*(self._generate_limited(prompt) for prompt in prompts))
 
     def process_response(self,
                         raw_response: str,
@@ -284,13 +366,14 @@ class ResponseProcessor:
         code_snippets = self._extract_code_snippets(raw_response)
 
         # Find references to context nodes
-        references = self._find_references(raw_response, context_nodes)
+        lower_response = raw_response.lower()
+        references = self._find_references(raw_response, context_nodes, lower_response)
 
         # Generate summary
         summary = self._generate_summary(raw_response)
 
         # Calculate confidence score
-        confidence = self._calculate_confidence(raw_response, references)
+        confidence = self._calculate_confidence(raw_response, references, code_snippets)
 
         # Convert to markdown
         markdown_content = self._format_as_markdown(
@@ -304,39 +387,43 @@ class ResponseProcessor:
             code_snippets=code_snippets,
             references=references,
             confidence_score=confidence,
-            markdown_content=markdown_content
+            markdown_content=markdown_content,
+            _content_lower=markdown_content.lower()
         )
 
     def _extract_code_snippets(self, text: str) -> List[str]:
         """Extract code snippets from markdown code blocks"""
-        code_block_pattern = r"```(?:python)?\n(.*?)\n```"
-        snippets = re.findall(code_block_pattern, text, re.DOTALL)
+        snippets = _CODE_BLOCK_RE.findall(text)
         return [snippet.strip() for snippet in snippets]
 
     def _find_references(self,
                         text: str,
-                        context_nodes: List[Dict[str, Any]]) -> List[CodeReference]:
+                        context_nodes: List[Dict[str, Any]],
+                        lower_text: Optional[str] = None) -> List[CodeReference]:
         """Find references to context nodes in the response"""
         references = []
+        if lower_text is None:
+            lower_text = text.lower()
+        mentions = _count_mentions(lower_text, [node['name'].lower() for node in context_nodes])
 
         for node in context_nodes:
-            if node['name'].lower() in text.lower():
+            name_mentions = mentions[node['name'].lower()]
+            if name_mentions:
                 references.append(CodeReference(
                     node_id=node['id'],
                     node_type=node['type'],
                     name=node['name'],
-                    relevance_score=self._calculate_relevance(text, node)
+                    relevance_score=self._calculate_relevance(lower_text, node, name_mentions)
                 ))
 
         return sorted(references, key=lambda x: x.relevance_score, reverse=True)
 
-    def _calculate_relevance(self, text: str, node: Dict[str, Any]) -> float:
+    def _calculate_relevance(self, lower_text: str, node: Dict[str, Any], name_mentions: int) -> float:
         """Calculate relevance score for a reference"""
         # Basic relevance scoring based on mention frequency and context
-        name_mentions = text.lower().count(node['name'].lower())
         context_relevance = 0.5  # Base relevance
 
-        if node.get('docstring', '').lower() in text.lower():
+        if node.get('docstring', '').lower() in lower_text:
             context_relevance += 0.3
 
         return (name_mentions * 0.2) + context_relevance
@@ -344,7 +431,7 @@ class ResponseProcessor:
     def _generate_summary(self, text: str, max_length: int = 200) -> str:
         """Generate a concise summary of the response"""
         # Remove code blocks
-        text_without_code = re.sub(r"```.*?```", "", text, flags=re.DOTALL)
+        text_without_code = _CODE_BLOCK_STRIP_RE.sub("", text)
 
         # Get first paragraph or sentence that makes sense as a summary
         paragraphs = text_without_code.split('\n\n')
@@ -358,16 +445,19 @@ class ResponseProcessor:
 
     def _calculate_confidence(self,
                             response: str,
-                            references: List[CodeReference]) -> float:
+                            references: List[CodeReference],
+                            code_snippets: Optional[List[str]] = None) -> float:
         """Calculate confidence score for the response"""
         confidence = 0.5  # Base confidence
+        if code_snippets is None:
+            code_snippets = self._extract_code_snippets(response)
 
         # Factors that increase confidence
         if references:
             confidence += 0.2
-        if self._extract_code_snippets(response):
+        if code_snippets:
             confidence += 0.1
-        if len(response.split()) > 50:  # Reasonable length
+        if _has_at_least_words(response, 51):  # Reasonable length
             confidence += 0.1
 
         # Cap at 1.0
@@ -401,8 +491,7 @@ class ResponseProcessor:
                 highlighted_text += f"- [{ref.name}] ({ref.node_type})\n"
 
         # Get Pygments CSS
-        css = self.html_formatter.get_style_defs('.highlight')
-        highlighted_text = f"<style>{css}</style>\n\n{highlighted_text}"
+        highlighted_text = f"<style>{self._pygments_css}</style>\n\n{highlighted_text}"
 
         return markdown.markdown(
             highlighted_text,
@@ -413,23 +502,26 @@ class ResponseProcessor:
                     responses: List[ProcessedResponse],
                     query: str) -> List[ProcessedResponse]:
         """Rank multiple responses by relevance to query"""
-        scored_responses = []
-
-        for response in responses:
-            # Calculate query relevance
-            query_terms = query.lower().split()
-            content = response.markdown_content.lower()
+        query_terms = _WORD_RE.findall(query.lower())
 
-            term_matches = sum(term in content for term in query_terms)
-            code_quality = len(response.code_snippets) * 0.2
-            reference_quality = len(response.references) * 0.1
+        # Sort on the score alone; equal scores keep their input order
+        return sorted(
+            responses,
+            key=lambda response: self._score_response(response, query_terms),
+            reverse=True
+        )
 
-            score = (term_matches * 0.4 +
-                    code_quality +
-                    reference_quality +
-                    response.confidence_score * 0.3)
+    def _score_response(self, response: ProcessedResponse, query_terms: List[str]) -> float:
+        """Score a single response against the lower-cased query terms"""
+        # Calculate query relevance
+        content = response._content_lower or response.markdown_content.lower()
+        content_terms = set(_WORD_RE.findall(content))
 
-            scored_responses.append((score, response))
+        term_matches = sum(1 for term in query_terms if term in content_terms)
+        code_quality = len(response.code_snippets) * 0.2
+        reference_quality = len(response.references) * 0.1
 
-        # Sort by score and return responses
-        return [r for _, r in sorted(scored_responses, reverse=True)]
\ No newline at end of file
+        return (term_matches * 0.4 +
+                code_quality +
+                reference_quality +
+                response.confidence_score * 0.3)
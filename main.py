@@ -10,29 +10,37 @@ from graph.graph_builder import GraphBuilder
 class CodeAssistant:
     def __init__(self):
         """Initialize the code assistant with query processing components"""
-        # Initialize GraphBuilder with the same Neo4j connection details as repo_fetch.py
-        self.graph_builder = GraphBuilder(
-            uri="neo4j+s://ded3cc9c.databases.neo4j.io",
-            user="neo4j",
-            password="RK3-MvYgHJ3ovL0dVuqGkOvgAKQbBayHxYgEsRpW1qI"
-        )
+        # One GraphBuilder (and Neo4j driver) shared by ingestion and querying
+        self.graph_builder = GraphBuilder.from_env()
         
         self.query_expander = QueryExpander()
-        self.similarity_analyzer = CodeSimilarityAnalyzer()
+        # Embeddings persist across runs, next to the AST cache
+        self.similarity_analyzer = CodeSimilarityAnalyzer(cache_dir="./data/.embcache")
         self.prompt_builder = PromptBuilder(self.graph_builder)  
         self.response_processor = ResponseProcessor()
 
     def __del__(self):
         """Cleanup when the instance is destroyed"""
+        # The prompt builder's session comes from the graph builder's driver
+        if hasattr(self, 'prompt_builder'):
+            self.prompt_builder.close()
         if hasattr(self, 'graph_builder'):
             self.graph_builder.close()
+
+    async def aclose(self):
+        """Release the connections held by the async components"""
+        await self.response_processor.aclose()
+        self.similarity_analyzer.close()
+        self.prompt_builder.close()
         
     async def initialize_from_repo(self, repo_url: str) -> Dict[str, Any]:
         """Initialize the knowledge graph from a GitHub repository"""
         try:
             # Process repository and build knowledge graph using repo_fetch
-            # This handles all Neo4j and graph schema initialization
-            analysis_results = process_github_repo(repo_url)
+            # on the assistant's own graph builder
+            analysis_results = process_github_repo(repo_url, self.graph_builder)
+            # The graph changed, so cached dependency lookups are stale
+            self.prompt_builder.invalidate_dependencies()
             
             return {
                 'status': 'success',
@@ -48,9 +56,8 @@ class CodeAssistant:
     async def process_query(self, query: str) -> Dict[str, Any]:
         """Process a user query using the existing knowledge graph"""
         try:
-            # Expand query with code-relevant terms
-            expanded_terms = self.query_expander.expand_query(query)
-            query_components = self.query_expander.decompose_query(query)
+            # Expand query with code-relevant terms and break it into components
+            expanded_terms, query_components = self.query_expander.process(query)
             
             # Use existing graph through similarity analyzer
             relevant_functions = self.similarity_analyzer.find_similar_functions(
@@ -71,7 +78,10 @@ class CodeAssistant:
             )
             
             raw_response = await self.response_processor.generate_response(prompt)
-            processed_response = self.response_processor.process_response(
+            # Highlighting and markdown rendering are CPU-bound, so keep
+            # them off the event loop
+            processed_response = await asyncio.to_thread(
+                self.response_processor.process_response,
                 raw_response,
                 relevant_functions
             )
@@ -114,5 +124,7 @@ async def main():
     response = await assistant.process_query(query)
     print("Query response:", response)
 
+    await assistant.aclose()
+
 if __name__ == "__main__":
     asyncio.run(main())
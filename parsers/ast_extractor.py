@@ -1,6 +1,6 @@
 import ast
 import os
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union
 from dataclasses import dataclass
 
 @dataclass
@@ -20,6 +20,64 @@ class ClassInfo:
     docstring: Optional[str]
     lineno: int
 
+def _callee_name(node: ast.AST) -> str:
+    """Build a dotted name for a callee or base expression."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return f"{_callee_name(node.value)}.{node.attr}"
+    return "<expr>"
+
+class _Collector(ast.NodeVisitor):
+    """Collects functions, classes and imports in a single pass over the tree."""
+
+    def __init__(self, extractor: 'ASTExtractor'):
+        self.extractor = extractor
+        self.functions: List[Dict[str, Any]] = []
+        self.classes: List[Dict[str, Any]] = []
+        self.imports: List[Dict[str, Any]] = []
+        # Depth of enclosing function/class definitions
+        self._scope_depth = 0
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        # Methods are handled with their class and nested functions with
+        # their parent, so only module-level functions are recorded
+        if self._scope_depth == 0:
+            self.functions.append(self.extractor._process_function(node))
+        self._visit_scope(node)
+
+    # Coroutines have the same shape and are recorded the same way
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self.classes.append(self.extractor._process_class(node))
+        self._visit_scope(node)
+
+    def _visit_scope(self, node: ast.AST):
+        # Keep descending so imports and nested classes are still collected
+        self._scope_depth += 1
+        self.generic_visit(node)
+        self._scope_depth -= 1
+
+    def visit_Import(self, node: ast.Import):
+        for name in node.names:
+            self.imports.append({
+                'type': 'import',
+                'name': name.name,
+                'asname': name.asname,
+                'lineno': node.lineno
+            })
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        for name in node.names:
+            self.imports.append({
+                'type': 'importfrom',
+                'module': node.module,
+                'name': name.name,
+                'asname': name.asname,
+                'lineno': node.lineno
+            })
+
 class ASTExtractor:
     def __init__(self):
         self.current_file: str = ""
@@ -29,9 +87,10 @@ class ASTExtractor:
         self.current_file = filepath
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
+            # Read bytes so ast.parse honours any PEP 263 encoding cookie
+            with open(filepath, 'rb') as f:
                 source = f.read()
-            return self.extract_from_source(source)
+            return self.extract_from_source(source, filename=filepath)
         except Exception as e:
             return {
                 'error': f'Failed to parse {filepath}: {str(e)}',
@@ -40,21 +99,21 @@ class ASTExtractor:
                 'imports': []
             }
 
-    def extract_from_source(self, source: str) -> Dict[str, Any]:
-        """Extract code structure from source code string."""
+    def extract_from_source(self, source: Union[str, bytes],
+                            filename: str = '<unknown>') -> Dict[str, Any]:
+        """Extract code structure from source code string or bytes."""
         try:
-            tree = ast.parse(source)
+            tree = ast.parse(source, filename=filename)
             
-            functions = self._extract_functions(tree)
-            classes = self._extract_classes(tree)
-            imports = self._extract_imports(tree)
+            collector = _Collector(self)
+            collector.visit(tree)
             
             return {
-                'functions': functions,
-                'classes': classes,
-                'imports': imports
+                'functions': collector.functions,
+                'classes': collector.classes,
+                'imports': collector.imports
             }
-        except Exception as e:
+        except (SyntaxError, ValueError) as e:
             return {
                 'error': f'Failed to parse source: {str(e)}',
                 'functions': [],
@@ -62,56 +121,7 @@ class ASTExtractor:
                 'imports': []
             }
 
-    def _extract_functions(self, tree: ast.AST) -> List[Dict[str, Any]]:
-        """Extract all function definitions."""
-        functions = []
-        
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                # Skip methods as they'll be handled in class extraction
-                if not self._is_method(node):
-                    func_info = self._process_function(node)
-                    functions.append(vars(func_info))
-                    
-        return functions
-
-    def _extract_classes(self, tree: ast.AST) -> List[Dict[str, Any]]:
-        """Extract all class definitions."""
-        classes = []
-        
-        for node in ast.walk(tree):
-            if isinstance(node, ast.ClassDef):
-                class_info = self._process_class(node)
-                classes.append(vars(class_info))
-                
-        return classes
-
-    def _extract_imports(self, tree: ast.AST) -> List[Dict[str, Any]]:
-        """Extract all imports."""
-        imports = []
-        
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for name in node.names:
-                    imports.append({
-                        'type': 'import',
-                        'name': name.name,
-                        'asname': name.asname,
-                        'lineno': node.lineno
-                    })
-            elif isinstance(node, ast.ImportFrom):
-                for name in node.names:
-                    imports.append({
-                        'type': 'importfrom',
-                        'module': node.module,
-                        'name': name.name,
-                        'asname': name.asname,
-                        'lineno': node.lineno
-                    })
-                    
-        return imports
-
-    def _process_function(self, node: ast.FunctionDef) -> FunctionInfo:
+    def _process_function(self, node: ast.FunctionDef) -> Dict[str, Any]:
         """Process a function node and extract its information."""
         # Extract function arguments
         args = [arg.arg for arg in node.args.args]
@@ -120,10 +130,8 @@ class ASTExtractor:
         calls = []
         for n in ast.walk(node):
             if isinstance(n, ast.Call):
-                if isinstance(n.func, ast.Name):
-                    calls.append(n.func.id)
-                elif isinstance(n.func, ast.Attribute):
-                    calls.append(f"{n.func.value.id}.{n.func.attr}")
+                if isinstance(n.func, (ast.Name, ast.Attribute)):
+                    calls.append(_callee_name(n.func))
         
         # Extract return type hint if available
         returns = None
@@ -133,40 +141,37 @@ class ASTExtractor:
             elif isinstance(node.returns, ast.Constant):
                 returns = str(node.returns.value)
         
-        return FunctionInfo(
-            name=node.name,
-            args=args,
-            docstring=ast.get_docstring(node),
-            calls=calls,
-            lineno=node.lineno,
-            returns=returns
-        )
+        # Built as a dict directly since that is what the graph layer consumes;
+        # the keys mirror FunctionInfo
+        return {
+            'name': node.name,
+            'args': args,
+            'docstring': ast.get_docstring(node),
+            'calls': calls,
+            'lineno': node.lineno,
+            'returns': returns
+        }
 
-    def _process_class(self, node: ast.ClassDef) -> ClassInfo:
+    def _process_class(self, node: ast.ClassDef) -> Dict[str, Any]:
         """Process a class node and extract its information."""
         # Extract base classes
         bases = []
         for base in node.bases:
-            if isinstance(base, ast.Name):
-                bases.append(base.id)
-            elif isinstance(base, ast.Attribute):
-                bases.append(f"{base.value.id}.{base.attr}")
+            if isinstance(base, (ast.Name, ast.Attribute)):
+                bases.append(_callee_name(base))
         
         # Extract methods
-        methods = []
-        for body_item in node.body:
-            if isinstance(body_item, ast.FunctionDef):
-                method_info = self._process_function(body_item)
-                methods.append(method_info)
+        methods = [
+            self._process_function(body_item)
+            for body_item in node.body
+            if isinstance(body_item, (ast.FunctionDef, ast.AsyncFunctionDef))
+        ]
         
-        return ClassInfo(
-            name=node.name,
-            bases=bases,
-            methods=methods,
-            docstring=ast.get_docstring(node),
-            lineno=node.lineno
-        )
-
-    def _is_method(self, node: ast.FunctionDef) -> bool:
-        """Check if a function definition is a method."""
-        return isinstance(node.parent, ast.ClassDef) if hasattr(node, 'parent') else False
\ No newline at end of file
+        # Keys mirror ClassInfo
+        return {
+            'name': node.name,
+            'bases': bases,
+            'methods': methods,
+            'docstring': ast.get_docstring(node),
+            'lineno': node.lineno
+        }
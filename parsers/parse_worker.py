@@ -0,0 +1,14 @@
+from multiprocessing import get_all_start_methods, get_context
+from parsers.ast_extractor import ASTExtractor
+
+# Workers must not inherit the parent's torch, model, HTTP client or Neo4j
+# driver state, so they are never forked from it. A forkserver imports the
+# main module once and forks cheap workers from that clean process; spawn is
+# the fallback where forkserver is unavailable
+MP_CONTEXT = get_context(
+    "forkserver" if "forkserver" in get_all_start_methods() else "spawn"
+)
+
+def parse_file(path):
+    # Lives in its own module so workers only import the extractor
+    return ASTExtractor().extract_from_file(path)
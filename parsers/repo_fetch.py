@@ -1,48 +1,135 @@
 import os
+import shelve
 import subprocess
-from parsers.ast_extractor import ASTExtractor
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from parsers.parse_worker import MP_CONTEXT, parse_file
 from graph.graph_builder import GraphBuilder
-from graph.graph_schema import GraphSchema
 
 def clone_github_repo(repo_url, repo_dir):
     if os.path.exists(repo_dir):
         print("Repository already exists. Using existing files.")
     else:
-        subprocess.run(["git", "clone", repo_url, repo_dir])
+        # Only the current tree is parsed, so skip history and tags, and
+        # fail fast instead of hanging on a credential prompt
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        subprocess.run(
+            ["git", "clone", "--depth=1", "--single-branch", "--no-tags",
+             repo_url, repo_dir],
+            check=True,
+            env=env
+        )
+
+# Directories that never hold project sources worth parsing
+SKIP_DIRS = frozenset({".git", "__pycache__", "venv", ".venv", "node_modules"})
 
 def extract_python_files(repo_dir):
     python_files = []
-    for root, _, files in os.walk(repo_dir):
-        for file in files:
-            if file.endswith(".py"):
-                python_files.append(os.path.join(root, file))
+    # Iterative DFS over scandir entries, which carry their type from the
+    # directory listing and so avoid a stat per file
+    stack = [repo_dir]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            # Unreadable or vanished directories are skipped, as os.walk does
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIP_DIRS:
+                        stack.append(entry.path)
+                elif entry.name.endswith(".py") and entry.is_file():
+                    python_files.append(entry.path)
     return python_files
 
-def process_github_repo(repo_url):
-    repo_dir = "./data/code"
+AST_CACHE_PATH = "./data/.astcache"
+# Bump whenever the extractor's output changes (including what _Collector
+# collects) so entries written by older versions are ignored
+AST_CACHE_VERSION = 3
+
+def _cache_key(path):
+    # mtime and size change whenever the file does, so stale entries are
+    # never hit and need no explicit invalidation
+    st = os.stat(path)
+    return f"v{AST_CACHE_VERSION}:{os.path.abspath(path)}:{st.st_mtime_ns}:{st.st_size}"
+
+@contextmanager
+def _cache_lock(cache_path):
+    # shelve has no concurrency control, so concurrent ingests take turns
+    with open(cache_path + ".lock", "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def parse_python_files(python_files, cache_path=AST_CACHE_PATH):
+    """Parse files, reusing cached results for files that have not changed."""
+    with _cache_lock(cache_path), shelve.open(cache_path) as cache:
+        keys = [_cache_key(path) for path in python_files]
 
-    neo4j_uri = "neo4j+s://ded3cc9c.databases.neo4j.io"
-    neo4j_user = "neo4j"
-    neo4j_password = "RK3-MvYgHJ3ovL0dVuqGkOvgAKQbBayHxYgEsRpW1qI"
+        # Entries for deleted or changed files, or older cache versions, can
+        # never be hit again, so drop them to keep the cache from growing
+        current = set(keys)
+        for key in [key for key in cache.keys() if key not in current]:
+            del cache[key]
+
+        parsed = [cache.get(key) for key in keys]
+        misses = [i for i, ast_data in enumerate(parsed) if ast_data is None]
+
+        if misses:
+            # Parsing is CPU-bound, so spread it over worker processes, with
+            # about four chunks per worker to balance load against IPC
+            chunksize = max(1, len(misses) // ((os.cpu_count() or 1) * 4))
+            with ProcessPoolExecutor(mp_context=MP_CONTEXT) as executor:
+                results = executor.map(
+                    parse_file,
+                    [python_files[i] for i in misses],
+                    chunksize=chunksize
+                )
+                for i, ast_data in zip(misses, results):
+                    parsed[i] = ast_data
+                    # Only cache successful parses so failures are retried
+                    if 'error' not in ast_data:
+                        cache[keys[i]] = ast_data
+
+    return parsed
+
+def process_github_repo(repo_url, builder=None):
+    repo_dir = "./data/code"
 
     clone_github_repo(repo_url, repo_dir)
     python_files = extract_python_files(repo_dir)
 
-    extractor = ASTExtractor()
-    builder = GraphBuilder(neo4j_uri, neo4j_user, neo4j_password)
-
-    GraphSchema.initialize_schema(builder)
+    parsed = parse_python_files(python_files)
 
-    analysis_results = []
-    for py_file in python_files:
-        ast_data = extractor.extract_from_file(py_file)
-        builder.create_code_graph(ast_data, py_file)
-        analysis_results.append({
+    analysis_results = [
+        {
             'file': py_file,
             'ast': ast_data
-        })
+        }
+        for py_file, ast_data in zip(python_files, parsed)
+    ]
 
-    builder.close()
+    # The Neo4j driver is not fork-safe, so writes stay in this process.
+    # Reuse the caller's builder when given one rather than opening a second
+    # driver against the same database
+    owns_builder = builder is None
+    if owns_builder:
+        builder = GraphBuilder.from_env()
+    try:
+        builder.create_code_graph_batch(analysis_results)
+    finally:
+        if owns_builder:
+            builder.close()
     print("Data successfully stored in Neo4j AuraDB!")
     return analysis_results
 
@@ -0,0 +1,63 @@
+import ast
+from multiprocessing import get_all_start_methods, get_context
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Fingerprint workers run in a forkserver (spawn where unavailable) so they
+# never inherit the analyzer's torch and model state. This module imports
+# only numpy, so each worker stays small
+MP_CONTEXT = get_context(
+    "forkserver" if "forkserver" in get_all_start_methods() else "spawn"
+)
+
+# Width of the hashed AST fingerprints, a power of two
+FINGERPRINT_BITS = 1024
+
+# Stable integer ids for AST node types; hash() is salted per process
+_NODE_TYPE_IDS = {
+    name: i
+    for i, name in enumerate(sorted(
+        name for name, obj in vars(ast).items()
+        if isinstance(obj, type) and issubclass(obj, ast.AST)
+    ), start=1)
+}
+
+def _hash_edges_numpy(parents: np.ndarray, children: np.ndarray, n_bits: int) -> np.ndarray:
+    """Set one bit per hashed (parent, child) type-id pair"""
+    bits = np.zeros(n_bits, dtype=np.uint8)
+    bits[((parents * 2654435761) ^ children) & (n_bits - 1)] = 1
+    return bits
+
+if njit is not None:
+    @njit(cache=True)
+    def _hash_edges(parents, children, n_bits):
+        bits = np.zeros(n_bits, dtype=np.uint8)
+        for i in range(parents.shape[0]):
+            bits[((parents[i] * 2654435761) ^ children[i]) & (n_bits - 1)] = 1
+        return bits
+else:
+    _hash_edges = _hash_edges_numpy
+
+def ast_fingerprint(tree: ast.AST) -> np.ndarray:
+    """Bit-packed set of hashed (parent type, child type) edges in tree"""
+    parents = []
+    children = []
+    for parent in ast.walk(tree):
+        a = _NODE_TYPE_IDS.get(type(parent).__name__, 0)
+        for child in ast.iter_child_nodes(parent):
+            parents.append(a)
+            children.append(_NODE_TYPE_IDS.get(type(child).__name__, 0))
+    bits = _hash_edges(
+        np.array(parents, dtype=np.int64),
+        np.array(children, dtype=np.int64),
+        FINGERPRINT_BITS
+    )
+    return np.packbits(bits)
+
+def fingerprint_source(code: str) -> np.ndarray:
+    """Fingerprint source code; module-level so worker processes can run it"""
+    return ast_fingerprint(ast.parse(code))
@@ -1,163 +1,233 @@
-from typing import List, Set
+from typing import List, Set, FrozenSet, Tuple
+from functools import lru_cache
+from types import MappingProxyType
+import threading
 import nltk
 from nltk.corpus import wordnet
+from nltk.corpus.reader.wordnet import NOUN, VERB, ADJ, ADV
 from nltk.tokenize import word_tokenize
 from nltk.tag import pos_tag
 from nltk.corpus import stopwords
 import re
 
+# (nltk.data path, download name) of every resource the expander uses; nltk
+# 3.9 loads the punkt_tab and _eng tagger resources rather than the pickles
+_RESOURCES = [
+    ('tokenizers/punkt_tab', 'punkt_tab'),
+    ('taggers/averaged_perceptron_tagger_eng', 'averaged_perceptron_tagger_eng'),
+    ('corpora/wordnet', 'wordnet'),
+    ('corpora/stopwords', 'stopwords')
+]
+
+# Identifier-like words of a query, for expansion without POS tagging
+_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+# Delimiters between words of snake_case, kebab-case and spaced identifiers
+_SPLIT_RE = re.compile(r'[-_\s]+')
+
+# Penn Treebank tag prefix to WordNet POS
+_POS_MAP = MappingProxyType({
+    'NN': NOUN,
+    'VB': VERB,
+    'JJ': ADJ,
+    'RB': ADV
+})
+
+# Programming-specific synonyms
+_CODE_SYNONYMS = MappingProxyType({
+    'get': frozenset({'fetch', 'retrieve', 'select', 'read'}),
+    'set': frozenset({'update', 'modify', 'write', 'assign'}),
+    'create': frozenset({'initialize', 'instantiate', 'new', 'define'}),
+    'delete': frozenset({'remove', 'destroy', 'drop'}),
+    'add': frozenset({'insert', 'append', 'push'}),
+    'list': frozenset({'array', 'collection', 'sequence'}),
+    'error': frozenset({'exception', 'fault', 'bug'}),
+    'function': frozenset({'method', 'procedure', 'routine'}),
+    'variable': frozenset({'var', 'field', 'property'}),
+    'class': frozenset({'type', 'struct', 'interface'})
+})
+
+# Common programming terms and concepts
+_CODE_TERMS = frozenset({
+    # Data structures
+    'array', 'list', 'stack', 'queue', 'tree', 'graph', 'hash', 'map',
+    # Programming concepts
+    'function', 'class', 'method', 'variable', 'loop', 'condition',
+    'interface', 'module', 'package', 'library', 'framework',
+    # Operations
+    'sort', 'search', 'filter', 'map', 'reduce', 'transform',
+    # Data types
+    'string', 'integer', 'float', 'boolean', 'object', 'null',
+    # Common actions
+    'initialize', 'instantiate', 'implement', 'extend', 'override',
+    # Web development
+    'api', 'request', 'response', 'route', 'endpoint', 'middleware',
+    # Database
+    'query', 'table', 'index', 'key', 'join', 'transaction'
+})
+
+_nltk_lock = threading.Lock()
+_nltk_ready = False
+
+def _resource_available(path: str) -> bool:
+    """Check whether an NLTK resource is installed"""
+    try:
+        nltk.data.find(path)
+        return True
+    except LookupError:
+        return False
+
+def _ensure_nltk():
+    """Download missing NLTK resources until all of them are available"""
+    global _nltk_ready
+    with _nltk_lock:
+        if _nltk_ready:
+            return
+        for path, name in _RESOURCES:
+            if not _resource_available(path):
+                nltk.download(name, quiet=True)
+        # A failed download leaves the flag unset so the next call retries it
+        _nltk_ready = all(_resource_available(path) for path, _ in _RESOURCES)
+
+@lru_cache(maxsize=16384)
+def _wordnet_synonyms(word: str, wn_pos: str) -> Tuple[str, ...]:
+    """Lower-cased lemma names of every synset of word with the given WordNet POS"""
+    return tuple({
+        lemma.name().lower()
+        for synset in wordnet.synsets(word, pos=wn_pos)
+        for lemma in synset.lemmas()
+    })
+
+@lru_cache(maxsize=16384)
+def _case_variants(word: str) -> FrozenSet[str]:
+    """Common code case variants of word"""
+    variants = set()
+    
+    # Original word
+    variants.add(word)
+    
+    # Split on common delimiters
+    parts = _SPLIT_RE.split(word)
+    
+    if len(parts) > 1:
+        # camelCase
+        camel = parts[0].lower() + ''.join(p.capitalize() for p in parts[1:])
+        variants.add(camel)
+        
+        # PascalCase
+        pascal = ''.join(p.capitalize() for p in parts)
+        variants.add(pascal)
+        
+        # snake_case
+        snake = '_'.join(p.lower() for p in parts)
+        variants.add(snake)
+        
+        # kebab-case
+        kebab = '-'.join(p.lower() for p in parts)
+        variants.add(kebab)
+    
+    return frozenset(variants)
+
 class QueryExpander:
+    # Shared by all instances; stop_words is filled in by the first one
+    stop_words: FrozenSet[str] = frozenset()
+    code_specific_terms: FrozenSet[str] = _CODE_TERMS
+
     def __init__(self):
         # Download required NLTK data
-        nltk.download('punkt')
-        nltk.download('averaged_perceptron_tagger')
-        nltk.download('wordnet')
-        nltk.download('stopwords')
-        
-        self.stop_words = set(stopwords.words('english'))
-        self.code_specific_terms = self._load_code_terms()
+        _ensure_nltk()
+
+        cls = type(self)
+        if not cls.stop_words:
+            cls.stop_words = frozenset(stopwords.words('english'))
 
     def expand_query(self, query: str) -> List[str]:
         """Expand a natural language query with code-relevant terms"""
-        # Tokenize and tag parts of speech
-        tokens = word_tokenize(query.lower())
-        tagged = pos_tag(tokens)
-        
-        # Extract key terms and expand
+        # Expansion does not need POS tags, so skip NLTK tokenizing and tagging;
+        # WordNet lookups then default to nouns. process() keeps the tagged path
         expanded_terms = set()
-        for word, tag in tagged:
+        for word in _TOKEN_RE.findall(query.lower()):
             if word not in self.stop_words:
-                # Add original term
-                expanded_terms.add(word)
-                
-                # Add code-specific synonyms
-                code_synonyms = self._get_code_synonyms(word)
-                expanded_terms.update(code_synonyms)
-                
-                # Add WordNet synonyms
-                wordnet_synonyms = self._get_wordnet_synonyms(word, tag)
-                expanded_terms.update(wordnet_synonyms)
-                
-                # Add camelCase and snake_case variants
-                variants = self._generate_case_variants(word)
-                expanded_terms.update(variants)
+                self._expand_term(word, '', expanded_terms)
 
         return list(expanded_terms)
 
     def decompose_query(self, query: str) -> dict:
         """Break down query into structured components"""
-        components = {
+        components = self._empty_components()
+
+        for word, tag in self._analyze(query):
+            if word not in self.stop_words:
+                self._classify_term(word, tag, components)
+
+        return components
+
+    def process(self, query: str) -> Tuple[List[str], dict]:
+        """Expand and decompose a query with a single tagging pass"""
+        expanded_terms = set()
+        components = self._empty_components()
+
+        for word, tag in self._analyze(query):
+            if word in self.stop_words:
+                continue
+            self._expand_term(word, tag, expanded_terms)
+            self._classify_term(word, tag, components)
+
+        return list(expanded_terms), components
+
+    def _analyze(self, query: str) -> List[Tuple[str, str]]:
+        """Tokenize and tag parts of speech"""
+        return pos_tag(word_tokenize(query.lower()))
+
+    @staticmethod
+    def _empty_components() -> dict:
+        """Return an empty query decomposition"""
+        return {
             'action_terms': set(),
             'object_terms': set(),
             'modifiers': set(),
             'technical_terms': set()
         }
 
-        # Tokenize and tag
-        tokens = word_tokenize(query.lower())
-        tagged = pos_tag(tokens)
-
-        for word, tag in tagged:
-            if word in self.stop_words:
-                continue
-
-            # Classify terms based on POS tags and code terminology
-            if tag.startswith('VB'):  # Verbs are usually actions
-                components['action_terms'].add(word)
-            elif tag.startswith('NN'):  # Nouns are usually objects
-                if word in self.code_specific_terms:
-                    components['technical_terms'].add(word)
-                else:
-                    components['object_terms'].add(word)
-            elif tag.startswith('JJ'):  # Adjectives are modifiers
-                components['modifiers'].add(word)
+    def _expand_term(self, word: str, tag: str, expanded_terms: Set[str]):
+        """Add a term and its expansions to expanded_terms"""
+        # Add original term
+        expanded_terms.add(word)
+        
+        # Add code-specific synonyms
+        expanded_terms.update(self._get_code_synonyms(word))
+        
+        # Add WordNet synonyms
+        expanded_terms.update(self._get_wordnet_synonyms(word, tag))
+        
+        # Add camelCase and snake_case variants
+        expanded_terms.update(self._generate_case_variants(word))
 
-        return components
+    def _classify_term(self, word: str, tag: str, components: dict):
+        """Add a term to its decomposition component"""
+        # Classify terms based on POS tags and code terminology
+        if tag.startswith('VB'):  # Verbs are usually actions
+            components['action_terms'].add(word)
+        elif tag.startswith('NN'):  # Nouns are usually objects
+            if word in self.code_specific_terms:
+                components['technical_terms'].add(word)
+            else:
+                components['object_terms'].add(word)
+        elif tag.startswith('JJ'):  # Adjectives are modifiers
+            components['modifiers'].add(word)
 
     def _get_wordnet_synonyms(self, word: str, pos_tag: str) -> Set[str]:
         """Get synonyms from WordNet based on part of speech"""
-        synonyms = set()
-        
-        # Map POS tag to WordNet POS
-        pos_map = {
-            'NN': wordnet.NOUN,
-            'VB': wordnet.VERB,
-            'JJ': wordnet.ADJ,
-            'RB': wordnet.ADV
-        }
-        
         # Get WordNet POS or default to NOUN
-        wn_pos = pos_map.get(pos_tag[:2], wordnet.NOUN)
+        wn_pos = _POS_MAP.get(pos_tag[:2], NOUN)
         
-        # Get synsets and their lemmas
-        for synset in wordnet.synsets(word, pos=wn_pos):
-            for lemma in synset.lemmas():
-                synonyms.add(lemma.name().lower())
-        
-        return synonyms
+        # Synset lookups hit the WordNet index, so they are cached
+        return set(_wordnet_synonyms(word, wn_pos))
 
     def _get_code_synonyms(self, word: str) -> Set[str]:
         """Get programming-specific synonyms"""
-        code_synonyms = {
-            'get': {'fetch', 'retrieve', 'select', 'read'},
-            'set': {'update', 'modify', 'write', 'assign'},
-            'create': {'initialize', 'instantiate', 'new', 'define'},
-            'delete': {'remove', 'destroy', 'drop'},
-            'add': {'insert', 'append', 'push'},
-            'list': {'array', 'collection', 'sequence'},
-            'error': {'exception', 'fault', 'bug'},
-            'function': {'method', 'procedure', 'routine'},
-            'variable': {'var', 'field', 'property'},
-            'class': {'type', 'struct', 'interface'}
-        }
-        
-        return code_synonyms.get(word.lower(), set())
+        return set(_CODE_SYNONYMS.get(word.lower(), ()))
 
     def _generate_case_variants(self, word: str) -> Set[str]:
         """Generate common code case variants"""
-        variants = set()
-        
-        # Original word
-        variants.add(word)
-        
-        # Split on common delimiters
-        parts = re.split(r'[-_\s]', word)
-        
-        if len(parts) > 1:
-            # camelCase
-            camel = parts[0].lower() + ''.join(p.capitalize() for p in parts[1:])
-            variants.add(camel)
-            
-            # PascalCase
-            pascal = ''.join(p.capitalize() for p in parts)
-            variants.add(pascal)
-            
-            # snake_case
-            snake = '_'.join(p.lower() for p in parts)
-            variants.add(snake)
-            
-            # kebab-case
-            kebab = '-'.join(p.lower() for p in parts)
-            variants.add(kebab)
-        
-        return variants
-
-    def _load_code_terms(self) -> Set[str]:
-        """Load common programming terms and concepts"""
-        return {
-            # Data structures
-            'array', 'list', 'stack', 'queue', 'tree', 'graph', 'hash', 'map',
-            # Programming concepts
-            'function', 'class', 'method', 'variable', 'loop', 'condition',
-            'interface', 'module', 'package', 'library', 'framework',
-            # Operations
-            'sort', 'search', 'filter', 'map', 'reduce', 'transform',
-            # Data types
-            'string', 'integer', 'float', 'boolean', 'object', 'null',
-            # Common actions
-            'initialize', 'instantiate', 'implement', 'extend', 'override',
-            # Web development
-            'api', 'request', 'response', 'route', 'endpoint', 'middleware',
-            # Database
-            'query', 'table', 'index', 'key', 'join', 'transaction'
-        }
\ No newline at end of file
+        return set(_case_variants(word))
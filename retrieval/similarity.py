@@ -1,10 +1,72 @@
 import ast
-from typing import List, Dict, Any, Tuple
+import hashlib
+import json
+import os
+from typing import List, Dict, Any, FrozenSet, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 import numpy as np
 from transformers import AutoTokenizer, AutoModel
 import torch
 from difflib import SequenceMatcher
+from retrieval.fingerprint import MP_CONTEXT, ast_fingerprint, fingerprint_source
+
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+def _cosine_similarities(target: np.ndarray, pool: np.ndarray) -> np.ndarray:
+    """Cosine similarity of one normalized vector against each normalized row of pool"""
+    if simsimd is None:
+        # Rows are normalized, so the dot product is the cosine similarity
+        return pool @ target
+    # Half precision is plenty for ranking and lets simsimd use its f16
+    # kernels, which move half the memory; it returns cosine distances
+    distances = simsimd.cdist(
+        target[np.newaxis].astype(np.float16, copy=False),
+        pool.astype(np.float16, copy=False),
+        metric="cosine"
+    )
+    return 1.0 - np.asarray(distances, dtype=np.float32)[0]
+
+def _lru_get(cache: 'OrderedDict', key):
+    """Return cache[key] or None, marking the entry as recently used"""
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+def _lru_put(cache: 'OrderedDict', key, value, max_size: int):
+    """Store value under key, evicting the least recently used entry past max_size"""
+    cache[key] = value
+    cache.move_to_end(key)
+    if len(cache) > max_size:
+        cache.popitem(last=False)
+
+# Set-bit count of every byte value
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Bit-packed dtype names for simsimd: "bin8" since 6.x, "b8" before
+_SIMSIMD_BIT_DTYPES = ["bin8", "b8"] if simsimd is not None else []
+
+def _jaccard(fp1: np.ndarray, fp2: np.ndarray) -> float:
+    """Jaccard similarity of two bit-packed fingerprints
+
+    Two empty fingerprints count as identical on every path.
+    """
+    union = int(_POPCOUNT[fp1 | fp2].sum())
+    if not union:
+        return 1.0
+    while _SIMSIMD_BIT_DTYPES:
+        try:
+            # simsimd returns the Jaccard distance
+            return 1.0 - float(simsimd.jaccard(fp1, fp2, _SIMSIMD_BIT_DTYPES[0]))
+        except (ValueError, TypeError):
+            # Not this simsimd version's spelling; never try it again
+            _SIMSIMD_BIT_DTYPES.pop(0)
+    return int(_POPCOUNT[fp1 & fp2].sum()) / union
 
 @dataclass
 class FunctionSimilarity:
@@ -16,46 +78,222 @@ class FunctionSimilarity:
     function2_name: str
 
 class CodeSimilarityAnalyzer:
-    def __init__(self):
+    MODEL_NAME = "microsoft/codebert-base"
+    # Identifies how embeddings are pooled, so persisted vectors from another
+    # pooling scheme are never reused
+    POOLING = "masked-mean-l2"
+    # Number of code snippets embedded per forward pass
+    EMBED_BATCH_SIZE = 32
+    # Maximum number of snippets whose embeddings, normalized ASTs and
+    # fingerprints are remembered
+    EMBED_CACHE_SIZE = 20000
+    AST_CACHE_SIZE = 20000
+    # Pools smaller than this are compared with the exact SequenceMatcher
+    # ratio instead of fingerprints
+    EXACT_AST_POOL_SIZE = 16
+    # Maximum number of function pairs whose similarities are remembered
+    PAIR_CACHE_SIZE = 50000
+    # Uncached fingerprints needed before spawning worker processes for them
+    PARALLEL_FINGERPRINT_MIN = 512
+    # Upper bound on fingerprint worker processes
+    FINGERPRINT_WORKERS = min(4, os.cpu_count() or 1)
+
+    def __init__(self, cache_dir: Optional[str] = None, dtype: Optional[torch.dtype] = None):
         # Initialize CodeBERT tokenizer and model
-        self.tokenizer = AutoTokenizer.from_pretrained("microsoft/codebert-base")
-        self.model = AutoModel.from_pretrained("microsoft/codebert-base")
+        self.tokenizer = AutoTokenizer.from_pretrained(self.MODEL_NAME)
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.dtype = dtype or self._default_dtype(self.device)
+        self.model = AutoModel.from_pretrained(self.MODEL_NAME).to(self.device, self.dtype)
         self.model.eval()  # Set to evaluation mode
 
+        # Normalized embeddings keyed by a hash of the code they were computed
+        # from, in LRU order
+        self._emb_cache: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        # Normalized AST strings and fingerprints, keyed the same way
+        self._normalized_cache: 'OrderedDict[str, str]' = OrderedDict()
+        self._fingerprint_cache: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        # (ast, semantic) similarities per unordered pair of snippets, in LRU order
+        self._pair_cache: 'OrderedDict[Tuple[FrozenSet[bytes], bool], Tuple[float, float]]' = OrderedDict()
+        # Worker pool for fingerprinting large pools, started on first use
+        self._fingerprint_executor: Optional[ProcessPoolExecutor] = None
+        self.cache_dir = cache_dir
+        if cache_dir:
+            self._load_embedding_cache()
+
     def compute_ast_similarity(self, ast1: ast.AST, ast2: ast.AST) -> float:
         """Compute structural similarity between two ASTs"""
-        # Convert ASTs to normalized string representations
-        str1 = self._normalize_ast(ast1)
-        str2 = self._normalize_ast(ast2)
-        
+        # Jaccard over hashed parent/child node-type pairs
+        return _jaccard(ast_fingerprint(ast1), ast_fingerprint(ast2))
+
+    def _code_ast_similarity(self, code1: str, code2: str, exact: bool = False) -> float:
+        """Compute structural similarity between two code snippets
+
+        exact compares normalized AST strings with SequenceMatcher, which is
+        more faithful but quadratic in the AST size.
+        """
+        if exact:
+            return self._sequence_similarity(self._normalize_code(code1), self._normalize_code(code2))
+        return _jaccard(self._fingerprint_code(code1), self._fingerprint_code(code2))
+
+    @staticmethod
+    def _sequence_similarity(str1: str, str2: str) -> float:
+        """Compare two normalized AST strings"""
         # Use SequenceMatcher for structural comparison
         matcher = SequenceMatcher(None, str1, str2)
         return matcher.ratio()
 
+    def _normalize_code(self, code: str) -> str:
+        """Return the normalized AST string of code, cached by content"""
+        key = self._code_key(code)
+        normalized = _lru_get(self._normalized_cache, key)
+        if normalized is None:
+            normalized = self._normalize_ast(ast.parse(code))
+            _lru_put(self._normalized_cache, key, normalized, self.AST_CACHE_SIZE)
+        return normalized
+
+    def _fingerprint_code(self, code: str) -> np.ndarray:
+        """Return the AST fingerprint of code, cached by content"""
+        key = self._code_key(code)
+        fingerprint = _lru_get(self._fingerprint_cache, key)
+        if fingerprint is None:
+            fingerprint = fingerprint_source(code)
+            _lru_put(self._fingerprint_cache, key, fingerprint, self.AST_CACHE_SIZE)
+        return fingerprint
+
     def compute_semantic_similarity(self, code1: str, code2: str) -> float:
         """Compute semantic similarity using CodeBERT embeddings"""
-        # Tokenize code snippets
-        tokens1 = self.tokenizer(code1, return_tensors="pt", truncation=True, max_length=512)
-        tokens2 = self.tokenizer(code2, return_tensors="pt", truncation=True, max_length=512)
+        embeddings = self._embed_batch([code1, code2])
+        return float(_cosine_similarities(embeddings[0], embeddings[1:])[0])
+
+    @staticmethod
+    def _default_dtype(device: torch.device) -> torch.dtype:
+        """Pick the inference precision for device
+
+        Embeddings are only used for cosine ranking, so half precision is
+        enough on GPUs; CPUs keep float32 since half-precision matmuls are
+        not reliably faster there.
+        """
+        if device.type != "cuda":
+            return torch.float32
+        return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+
+    @staticmethod
+    def _code_key(code: str) -> str:
+        """Return the embedding cache key for a code snippet"""
+        return hashlib.blake2b(code.encode()).hexdigest()
+
+    @staticmethod
+    def _code_digest(code: str) -> bytes:
+        """Return a short content digest of a code snippet for pair keys"""
+        return hashlib.blake2b(code.encode(), digest_size=16).digest()
+
+    def _embed_batch(self, codes: List[str]) -> np.ndarray:
+        """Embed code snippets, returning L2-normalized rows
+
+        Cached snippets are reused; the rest go through the model in padded
+        mini-batches.
+        """
+        keys = [self._code_key(code) for code in codes]
+        # Collected locally so entries evicted mid-call are still returned
+        embeddings: Dict[str, np.ndarray] = {}
+        for key in keys:
+            hit = _lru_get(self._emb_cache, key)
+            if hit is not None:
+                embeddings[key] = hit
+        missing = [(key, code) for key, code in dict(zip(keys, codes)).items()
+                   if key not in embeddings]
+        # Batches pad to their longest snippet, so group snippets of similar
+        # length to keep short helpers from being padded to long ones
+        missing.sort(key=lambda item: len(item[1]))
 
-        with torch.no_grad():
-            # Get embeddings
-            embedding1 = self.model(**tokens1).last_hidden_state.mean(dim=1)
-            embedding2 = self.model(**tokens2).last_hidden_state.mean(dim=1)
+        # inference_mode also skips autograd's version-counter bookkeeping
+        with torch.inference_mode():
+            for start in range(0, len(missing), self.EMBED_BATCH_SIZE):
+                chunk = missing[start:start + self.EMBED_BATCH_SIZE]
+                batch = self.tokenizer(
+                    [code for _, code in chunk],
+                    padding=True,
+                    truncation=True,
+                    max_length=512,
+                    return_tensors="pt"
+                ).to(self.device)
+                # Pool and normalize in float32 whatever the model precision
+                hidden = self.model(**batch).last_hidden_state.float()
+                # Average only over real tokens so padding does not dilute the mean
+                mask = batch['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+                pooled = torch.nn.functional.normalize(pooled, dim=1).cpu().numpy()
+                for (key, _), embedding in zip(chunk, pooled):
+                    embeddings[key] = embedding
+                    _lru_put(self._emb_cache, key, embedding, self.EMBED_CACHE_SIZE)
 
-            # Compute cosine similarity
-            similarity = torch.nn.functional.cosine_similarity(embedding1, embedding2)
-            return float(similarity[0])
+        return np.stack([embeddings[key] for key in keys])
+
+    def compute_semantic_similarity_batch(self, target_code: str, pool_codes: List[str]) -> List[float]:
+        """Compute semantic similarity of target_code against every snippet in pool_codes"""
+        if not pool_codes:
+            return []
+        embeddings = self._embed_batch([target_code] + pool_codes)
+        return _cosine_similarities(embeddings[0], embeddings[1:]).tolist()
+
+    def _cache_files(self) -> Tuple[str, str]:
+        """Return the embedding matrix and key index paths under cache_dir
+
+        The names carry the model, dtype and pooling, so vectors computed
+        under a different setup are never loaded.
+        """
+        setup = f"{self.MODEL_NAME}|{self.dtype}|{self.POOLING}"
+        tag = hashlib.blake2b(setup.encode(), digest_size=8).hexdigest()
+        return (os.path.join(self.cache_dir, f"code_embeddings-{tag}.npy"),
+                os.path.join(self.cache_dir, f"code_embeddings-{tag}.json"))
+
+    def _load_embedding_cache(self):
+        """Load embeddings saved by save_embedding_cache, if any"""
+        matrix_path, index_path = self._cache_files()
+        if not (os.path.exists(matrix_path) and os.path.exists(index_path)):
+            return
+        with open(index_path) as f:
+            keys = json.load(f)
+        matrix = np.load(matrix_path)
+        if len(keys) != len(matrix):
+            return  # Interrupted save; the vectors can't be matched to their keys
+        # Saved in LRU order, so only the most recent entries are kept
+        for key, embedding in zip(keys[-self.EMBED_CACHE_SIZE:], matrix[-self.EMBED_CACHE_SIZE:]):
+            self._emb_cache[key] = embedding
+
+    def save_embedding_cache(self):
+        """Persist the embedding cache to cache_dir as a matrix plus a key index"""
+        if not self.cache_dir or not self._emb_cache:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        matrix_path, index_path = self._cache_files()
+        keys = list(self._emb_cache)
+        # Write to temporary files first so a crash never leaves a truncated file
+        with open(matrix_path + ".tmp", 'wb') as f:
+            np.save(f, np.stack([self._emb_cache[key] for key in keys]))
+        with open(index_path + ".tmp", 'w') as f:
+            json.dump(keys, f)
+        os.replace(matrix_path + ".tmp", matrix_path)
+        os.replace(index_path + ".tmp", index_path)
+
+    def close(self):
+        """Persist the embedding cache and stop the fingerprint workers"""
+        self.save_embedding_cache()
+        if self._fingerprint_executor is not None:
+            self._fingerprint_executor.shutdown()
+            self._fingerprint_executor = None
 
     def compare_functions(self, func1: Dict[str, Any], func2: Dict[str, Any]) -> FunctionSimilarity:
         """Compare two functions using both AST and semantic similarity"""
-        # Parse function code into ASTs
-        ast1 = ast.parse(func1['code'])
-        ast2 = ast.parse(func2['code'])
-
-        # Compute similarities
-        ast_sim = self.compute_ast_similarity(ast1, ast2)
-        semantic_sim = self.compute_semantic_similarity(func1['code'], func2['code'])
+        key = self._pair_key(func1['code'], func2['code'], True)
+        scores = self._cached_pair(key)
+        if scores is None:
+            # Compute similarities
+            ast_sim = self._code_ast_similarity(func1['code'], func2['code'], exact=True)
+            semantic_sim = self.compute_semantic_similarity(func1['code'], func2['code'])
+            self._cache_pair(key, ast_sim, semantic_sim)
+        else:
+            ast_sim, semantic_sim = scores
 
         # Combine similarities (weighted average)
         combined_sim = 0.4 * ast_sim + 0.6 * semantic_sim
@@ -73,37 +311,119 @@ class CodeSimilarityAnalyzer:
                              function_pool: List[Dict[str, Any]], 
                              threshold: float = 0.7) -> List[FunctionSimilarity]:
         """Find similar functions in a pool of functions"""
-        similarities = []
-        
-        for func in function_pool:
-            if func['name'] != target_func['name']:  # Don't compare with self
-                similarity = self.compare_functions(target_func, func)
-                if similarity.combined_similarity >= threshold:
-                    similarities.append(similarity)
+        target_code = target_func['code']
+        candidates = [func for func in function_pool
+                      if not self._is_same_function(target_func, func)]  # Don't compare with self
+        exact = len(candidates) < self.EXACT_AST_POOL_SIZE
+
+        # Only pairs not seen before need embedding, and identical code is
+        # known to score 1.0 on both measures
+        target_digest = self._code_digest(target_code)
+        digests = [self._code_digest(func['code']) for func in candidates]
+        keys = [(frozenset((target_digest, digest)), exact) for digest in digests]
+        cached = [(1.0, 1.0) if digest == target_digest else self._cached_pair(key)
+                  for digest, key in zip(digests, keys)]
+        uncached = [i for i, scores in enumerate(cached) if scores is None]
+        semantic_sims = dict(zip(uncached, self.compute_semantic_similarity_batch(
+            target_code,
+            [candidates[i]['code'] for i in uncached]
+        )))
+
+        # Structural similarity only for candidates the semantic score leaves
+        # able to reach the threshold, as AST similarity is at most 1
+        pending = [i for i in uncached if 0.6 * semantic_sims[i] + 0.4 >= threshold]
+        ast_sims = self._ast_similarities(
+            target_code,
+            [candidates[i]['code'] for i in pending],
+            exact
+        )
+        for i, ast_sim in zip(pending, ast_sims):
+            cached[i] = (ast_sim, semantic_sims[i])
+            self._cache_pair(keys[i], ast_sim, semantic_sims[i])
+
+        scored = [i for i, scores in enumerate(cached) if scores is not None]
+        if not scored:
+            return []
+        scores = np.array([cached[i] for i in scored], dtype=np.float64)
+        combined = 0.4 * scores[:, 0] + 0.6 * scores[:, 1]
+
+        # Sort by combined similarity score, keeping pool order on ties
+        order = np.argsort(-combined, kind='stable')
+        return [
+            FunctionSimilarity(
+                ast_similarity=float(scores[k, 0]),
+                semantic_similarity=float(scores[k, 1]),
+                combined_similarity=float(combined[k]),
+                function1_name=target_func['name'],
+                function2_name=candidates[scored[k]]['name']
+            )
+            for k in order
+            if combined[k] >= threshold
+        ]
+
+    def _ast_similarities(self, target_code: str, codes: List[str], exact: bool) -> List[float]:
+        """Compute structural similarity of target_code against each of codes"""
+        if exact or not codes:
+            return [self._code_ast_similarity(target_code, code, exact) for code in codes]
+
+        self._prefetch_fingerprints([target_code] + codes)
+        target = self._fingerprint_code(target_code)
+        pool = np.stack([self._fingerprint_code(code) for code in codes])
+        # Jaccard of every row against the target in one vectorized pass
+        intersection = _POPCOUNT[pool & target].sum(axis=1, dtype=np.int64)
+        union = _POPCOUNT[pool | target].sum(axis=1, dtype=np.int64)
+        return np.where(union > 0, intersection / np.maximum(union, 1), 1.0).tolist()
+
+    def _prefetch_fingerprints(self, codes: List[str]):
+        """Fingerprint uncached snippets, across processes for large batches"""
+        keyed = {self._code_key(code): code for code in codes}
+        missing = [(key, code) for key, code in keyed.items()
+                   if key not in self._fingerprint_cache]
+        if len(missing) < self.PARALLEL_FINGERPRINT_MIN:
+            return  # _fingerprint_code fills these in cheaply enough
+
+        # Parsing and hashing are pure Python, so spread them over processes.
+        # Workers are never forked from this process, which runs torch,
+        # tokenizer and driver threads, and they are kept for reuse
+        if self._fingerprint_executor is None:
+            self._fingerprint_executor = ProcessPoolExecutor(
+                max_workers=self.FINGERPRINT_WORKERS,
+                mp_context=MP_CONTEXT
+            )
+        fingerprints = self._fingerprint_executor.map(
+            fingerprint_source,
+            [code for _, code in missing],
+            chunksize=32
+        )
+        for (key, _), fingerprint in zip(missing, fingerprints):
+            _lru_put(self._fingerprint_cache, key, fingerprint, self.AST_CACHE_SIZE)
+
+    @staticmethod
+    def _is_same_function(func1: Dict[str, Any], func2: Dict[str, Any]) -> bool:
+        """Check whether two pool entries describe the same function"""
+        # Homonyms in different files are distinct functions
+        return func1['name'] == func2['name'] and func1.get('file') == func2.get('file')
+
+    def _pair_key(self, code1: str, code2: str, exact: bool) -> Tuple[FrozenSet[bytes], bool]:
+        """Return the order-independent pair cache key for two snippets"""
+        return (frozenset((self._code_digest(code1), self._code_digest(code2))), exact)
+
+    def _cached_pair(self, key: Tuple[FrozenSet[bytes], bool]) -> Optional[Tuple[float, float]]:
+        """Return the cached (ast, semantic) similarities for a pair, if any"""
+        return _lru_get(self._pair_cache, key)
 
-        # Sort by combined similarity score
-        return sorted(similarities, key=lambda x: x.combined_similarity, reverse=True)
+    def _cache_pair(self, key: Tuple[FrozenSet[bytes], bool], ast_sim: float, semantic_sim: float):
+        """Store the similarities of a pair, evicting the least recently used"""
+        _lru_put(self._pair_cache, key, (ast_sim, semantic_sim), self.PAIR_CACHE_SIZE)
 
     def _normalize_ast(self, tree: ast.AST) -> str:
         """Convert AST to normalized string representation"""
-        class ASTNormalizer(ast.NodeVisitor):
-            def __init__(self):
-                self.tokens = []
-                self.generic_var_counter = 0
-                self.var_map = {}
-
-            def generic_visit(self, node):
-                node_type = type(node).__name__
-                if isinstance(node, ast.Name):
-                    # Normalize variable names
-                    if node.id not in self.var_map:
-                        self.var_map[node.id] = f"VAR_{self.generic_var_counter}"
-                        self.generic_var_counter += 1
-                    self.tokens.append(self.var_map[node.id])
-                else:
-                    self.tokens.append(node_type)
-                ast.NodeVisitor.generic_visit(self, node)
-
-        normalizer = ASTNormalizer()
-        normalizer.visit(tree)
-        return " ".join(normalizer.tokens)
\ No newline at end of file
+        tokens = []
+        var_map = {}
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name):
+                # Normalize variable names
+                tokens.append(var_map.setdefault(node.id, f"VAR_{len(var_map)}"))
+            else:
+                tokens.append(type(node).__name__)
+        return " ".join(tokens)